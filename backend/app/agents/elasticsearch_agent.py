@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional, TypedDict
 from langgraph.graph import StateGraph, END
@@ -121,14 +122,17 @@ class ElasticsearchAgent:
                 except Exception as e:
                     logger.warning(f"Context retrieval failed: {e}")
             
-            # Enhanced intent analysis with context
-            intent_analysis = await self.gemini_service.analyze_query_intent(
+            # Enhanced intent analysis with context; the query is generated in
+            # the same Gemini request to save a round-trip
+            intent_analysis, es_query = await self.gemini_service.analyze_and_generate(
                 user_message,
+                state.get("available_indices", []),
                 similar_queries=similar_queries,
                 conversation_context=conversation_context
             )
             
             state["intent_analysis"] = intent_analysis
+            state["elasticsearch_query"] = es_query
             state["similar_queries"] = similar_queries
             state["conversation_context"] = conversation_context
             logger.info(f"Enhanced intent analyzed: {intent_analysis.get('intent', 'unknown')}")
@@ -203,8 +207,14 @@ class ElasticsearchAgent:
             intent_analysis = state.get("intent_analysis", {})
             available_indices = state.get("available_indices", [])
             
-            # Check cache first
+            if state.get("elasticsearch_query"):
+                # Already generated together with the intent analysis
+                logger.info("Elasticsearch query generated")
+                return state
+            
             query_hash = self._generate_query_hash(state["user_message"], intent_analysis)
+            
+            # Check cache first
             cached_query = await self.redis_service.get_cached_query(query_hash)
             
             if cached_query:
@@ -260,13 +270,6 @@ class ElasticsearchAgent:
             
             state["query_results"] = query_results
             
-            # Generate enhanced chart config if needed and data is available
-            if query_results.get("total_hits", 0) > 0:
-                chart_config = await self._generate_enhanced_chart_config(
-                    intent_analysis, query_results
-                )
-                state["chart_config"] = chart_config
-            
             logger.info(f"Query executed successfully on '{target_index}': {query_results['total_hits']} hits")
             
         except Exception as e:
@@ -290,10 +293,19 @@ class ElasticsearchAgent:
                 # Generate error response
                 state["response_message"] = f"I apologize, but I encountered an issue: {state['error']}. Please try rephrasing your question."
             else:
-                # Generate enhanced response with intelligence insights
-                base_response = await self.gemini_service.generate_response_message(
+                # The response text and the chart config are independent Gemini
+                # calls, so run them concurrently
+                response_task = self.gemini_service.generate_response_message(
                     user_message, query_results, intent_analysis
                 )
+                if query_results.get("total_hits", 0) > 0:
+                    base_response, chart_config = await asyncio.gather(
+                        response_task,
+                        self._generate_enhanced_chart_config(intent_analysis, query_results)
+                    )
+                    state["chart_config"] = chart_config
+                else:
+                    base_response = await response_task
                 
                 # Enhance response with intelligence insights
                 enhanced_response = self._enhance_response_with_intelligence(
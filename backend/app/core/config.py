@@ -32,9 +32,11 @@ class Settings(BaseSettings):
     redis_port: int = Field(default=6379, env="REDIS_PORT")
     redis_db: int = Field(default=0, env="REDIS_DB")
     redis_password: Optional[str] = Field(default=None, env="REDIS_PASSWORD")
+    redis_max_connections: int = Field(default=64, env="REDIS_MAX_CONNECTIONS")
     
     # Google Gemini API
     google_api_key: str = Field(..., env="GOOGLE_API_KEY")
+    gemini_max_concurrency: int = Field(default=8, env="GEMINI_MAX_CONCURRENCY")
     
     # Cache settings
     query_cache_ttl: int = Field(default=300, env="QUERY_CACHE_TTL")  # 5 minutes
@@ -43,6 +45,13 @@ class Settings(BaseSettings):
     # Agent settings
     max_query_size: int = Field(default=1000, env="MAX_QUERY_SIZE")
     default_chart_type: str = Field(default="bar", env="DEFAULT_CHART_TYPE")
+    # Chart recommendations at or above this confidence get a templated explanation instead of a Gemini call
+    chart_explanation_ai_threshold: float = Field(default=0.85, env="CHART_EXPLANATION_AI_THRESHOLD")
+    
+    # Vector DB settings
+    # Shared directory the embedding model is downloaded to and loaded from, so
+    # every worker reads one copy of the files (and of their pages in the OS cache)
+    embedding_model_dir: Optional[str] = Field(default=None, env="EMBEDDING_MODEL_DIR")
     
     @property
     def elasticsearch_url(self) -> str:
@@ -5,7 +5,11 @@ from fastapi import Depends, HTTPException, status
 
 from app.core.config import settings
 from app.core.exceptions import ServiceUnavailableError
-from app.services.elasticsearch import ElasticsearchService
+from app.services.elasticsearch import (
+    ElasticsearchService,
+    close_shared_elasticsearch_service,
+    get_shared_elasticsearch_service
+)
 from app.services.gemini import GeminiService
 from app.services.redis import RedisService
 from app.services.vector_db import VectorDBService
@@ -104,11 +108,11 @@ async def get_elasticsearch_agent() -> ElasticsearchAgent:
 
 
 # Service initialization functions
-def initialize_services():
+async def initialize_services():
     """Initialize all services."""
     global _elasticsearch_service, _gemini_service, _redis_service, _vector_db_service, _elasticsearch_agent
     
-    _elasticsearch_service = ElasticsearchService()
+    _elasticsearch_service = get_shared_elasticsearch_service()
     _gemini_service = GeminiService()
     _redis_service = RedisService()
     _vector_db_service = VectorDBService()
@@ -118,6 +122,9 @@ def initialize_services():
         redis_service=_redis_service,
         vector_db_service=_vector_db_service
     )
+    
+    # Load the embedding model and embed common prompts before the first request
+    await _vector_db_service.warmup()
 
 
 async def cleanup_services():
@@ -125,7 +132,7 @@ async def cleanup_services():
     global _elasticsearch_service, _gemini_service, _redis_service, _vector_db_service, _elasticsearch_agent
     
     if _elasticsearch_service:
-        await _elasticsearch_service.close()
+        await close_shared_elasticsearch_service()
     
     if _redis_service:
         await _redis_service.close()
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -44,4 +44,41 @@ class ChartConfig(BaseModel):
     title: str = Field(..., description="Chart title")
     x_axis: Optional[str] = Field(None, description="X-axis field")
     y_axis: Optional[str] = Field(None, description="Y-axis field")
-    options: Dict[str, Any] = Field(default_factory=dict, description="Additional chart options") 
\ No newline at end of file
+    options: Dict[str, Any] = Field(default_factory=dict, description="Additional chart options")
+
+
+class IntentAnalysisSchema(BaseModel):
+    """Structured output schema for Gemini intent analysis.
+    
+    Literal fields become enums in the response schema, so Gemini can only
+    return values that intent validation accepts.
+    """
+    intent: Literal["search", "aggregate", "filter", "chart", "count", "general"] = Field(
+        ..., description="What the user wants to do"
+    )
+    index: Optional[str] = Field(None, description="Elasticsearch index to query")
+    time_range: Optional[Literal["last_30_days", "last_week", "today", "last_hour", "last_24_hours"]] = Field(
+        None, description="Time-based filter, if any"
+    )
+    fields: Optional[List[str]] = Field(None, description="Relevant fields mentioned")
+    chart_type: Optional[Literal["line", "bar", "pie", "scatter", "area"]] = Field(
+        None, description="Requested visualization, if any"
+    )
+    aggregation_type: Optional[Literal["terms", "date_histogram", "avg", "sum", "count"]] = Field(
+        None, description="Type of aggregation needed"
+    )
+    query_description: str = Field(..., description="Brief description of what the user wants")
+    context_relevance: Optional[str] = Field(None, description="How this relates to previous conversation")
+    confidence: float = Field(..., description="Confidence in the analysis (0.0-1.0)")
+
+
+class IntentQuerySchema(BaseModel):
+    """Structured output schema for combined intent analysis and query generation.
+    
+    The intent keeps its enum constraints; the Elasticsearch query is
+    free-form, so it is only constrained to be a JSON object (or null).
+    """
+    intent_analysis: IntentAnalysisSchema = Field(..., description="Intent analysis of the user message")
+    es_query: Optional[Dict[str, Any]] = Field(
+        None, description="Elasticsearch query for the intent, or null for general intent"
+    )
@@ -33,6 +33,10 @@ class DataCharacteristic(Enum):
     HIERARCHICAL = "hierarchical"
 
 
+# Valid ChartType values, used to convert user preference strings without raising
+_CHART_TYPE_VALUES = frozenset(chart_type.value for chart_type in ChartType)
+
+
 @dataclass
 class ChartRecommendation:
     """Chart recommendation with confidence score."""
@@ -218,8 +222,10 @@ class ChartRecommendationService:
             
             # Check for correlation
             try:
-                corr_matrix = df[numeric_fields].corr()
-                max_correlation = corr_matrix.abs().max().max()
+                corr_values = np.abs(df[numeric_fields].corr().to_numpy())
+                # Ignore the trivial self-correlation on the diagonal
+                np.fill_diagonal(corr_values, np.nan)
+                max_correlation = np.nanmax(corr_values)
                 if max_correlation > 0.7:  # Strong correlation threshold
                     characteristics.append(DataCharacteristic.CORRELATION)
             except Exception:
@@ -240,12 +246,17 @@ class ChartRecommendationService:
         self,
         data: List[Dict[str, Any]],
         intent: Optional[str] = None,
-        user_preferences: Optional[Dict[str, Any]] = None
+        user_preferences: Optional[Dict[str, Any]] = None,
+        profile: Optional[DataProfile] = None
     ) -> List[ChartRecommendation]:
-        """Generate chart recommendations based on data analysis."""
+        """Generate chart recommendations based on data analysis.
+        
+        Pass a precomputed ``profile`` to skip re-analyzing the same data.
+        """
         
         # Analyze the data
-        profile = self.analyze_data(data)
+        if profile is None:
+            profile = self.analyze_data(data)
         
         if profile.total_records == 0:
             return []
@@ -269,7 +280,7 @@ class ChartRecommendationService:
         # Sort by confidence and remove duplicates
         unique_recommendations = {}
         for rec in recommendations:
-            key = rec.chart_type.value
+            key = rec.chart_type
             if key not in unique_recommendations or rec.confidence > unique_recommendations[key].confidence:
                 unique_recommendations[key] = rec
         
@@ -462,21 +473,24 @@ class ChartRecommendationService:
         # Preferred chart types
         preferred_types = preferences.get('preferred_chart_types', [])
         if preferred_types:
+            preferred_set = {
+                ChartType(value) for value in preferred_types if value in _CHART_TYPE_VALUES
+            }
             for rec in recommendations:
-                if rec.chart_type.value in preferred_types:
+                if rec.chart_type in preferred_set:
                     rec.confidence = min(1.0, rec.confidence + 0.1)
         
         # Complexity preference
         complexity = preferences.get('complexity', 'medium')
         if complexity == 'simple':
             # Boost simple chart types
-            simple_types = [ChartType.BAR, ChartType.PIE, ChartType.LINE]
+            simple_types = {ChartType.BAR, ChartType.PIE, ChartType.LINE}
             for rec in recommendations:
                 if rec.chart_type in simple_types:
                     rec.confidence = min(1.0, rec.confidence + 0.05)
         elif complexity == 'advanced':
             # Boost complex chart types
-            complex_types = [ChartType.SCATTER, ChartType.HEATMAP, ChartType.BOX]
+            complex_types = {ChartType.SCATTER, ChartType.HEATMAP, ChartType.BOX}
             for rec in recommendations:
                 if rec.chart_type in complex_types:
                     rec.confidence = min(1.0, rec.confidence + 0.05)
@@ -1,13 +1,44 @@
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import ConnectionError, NotFoundError
+from elasticsearch.helpers import async_scan
+from elasticsearch.serializer import JSONSerializer
 import logging
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
 from app.core.config import settings
 from app.core.exceptions import ElasticsearchError
 
 logger = logging.getLogger(__name__)
 
+# Index metadata changes rarely, so `list_indices` results are reused for this long
+INDICES_CACHE_TTL = 30.0
+
+# Pooled keep-alive connections per Elasticsearch node
+ES_CONNECTIONS_PER_NODE = 16
+
+
+class ORJSONSerializer(JSONSerializer):
+    """JSON serializer backed by orjson for faster request/response handling."""
+    
+    def loads(self, data: Any) -> Any:
+        return orjson.loads(data)
+    
+    def dumps(self, data: Any) -> bytes:
+        # Pre-serialized bodies are passed through untouched
+        if isinstance(data, str):
+            return data.encode("utf-8", "surrogatepass")
+        if isinstance(data, bytes):
+            return data
+        # datetimes are encoded natively; NumPy scalars and arrays skip the
+        # `default` fallback
+        return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY)
+
 
 class ElasticsearchService:
     """Elasticsearch service for handling ES operations."""
@@ -20,8 +51,13 @@ class ElasticsearchService:
             "request_timeout": 30,
             "retry_on_timeout": True,
             "max_retries": 3,
+            "connections_per_node": ES_CONNECTIONS_PER_NODE,
         }
         
+        # Use orjson for (de)serialization when it is installed
+        if orjson is not None:
+            connection_params["serializer"] = ORJSONSerializer()
+        
         # Add authentication if provided
         if settings.elasticsearch_username and settings.elasticsearch_password:
             connection_params["basic_auth"] = (
@@ -32,6 +68,9 @@ class ElasticsearchService:
         # Initialize client with connection pooling
         self.client = AsyncElasticsearch(**connection_params)
         
+        # (fetched_at, indices) from the last successful `cat.indices` call
+        self._indices_cache: Optional[Tuple[float, List[str]]] = None
+        
         logger.info(f"Elasticsearch client initialized: {settings.elasticsearch_url}")
     
     async def health_check(self) -> bool:
@@ -69,21 +108,54 @@ class ElasticsearchService:
             return {}
     
     async def list_indices(self) -> List[str]:
-        """List all indices."""
+        """List all non-system indices, served from a short-lived cache."""
+        if self._indices_cache is not None:
+            fetched_at, indices = self._indices_cache
+            if time.monotonic() - fetched_at < INDICES_CACHE_TTL:
+                return list(indices)
+        
         try:
-            response = await self.client.cat.indices(format="json")
-            return [index["index"] for index in response if not index["index"].startswith(".")]
+            # Only request the index name column to keep the response small
+            response = await self.client.cat.indices(format="json", h="index")
+            indices = [index["index"] for index in response if not index["index"].startswith(".")]
+            self._indices_cache = (time.monotonic(), indices)
+            return list(indices)
         except Exception as e:
             logger.error(f"Failed to list indices: {e}")
             return []
     
+    def invalidate_indices_cache(self) -> None:
+        """Drop the cached index list so the next `list_indices` refetches it."""
+        self._indices_cache = None
+    
+    async def create_index(self, index: str, body: Dict[str, Any]) -> None:
+        """Create an index and invalidate the cached index list."""
+        try:
+            await self.client.indices.create(index=index, body=body)
+        finally:
+            self.invalidate_indices_cache()
+    
+    async def delete_index(self, index: str, ignore_unavailable: bool = False) -> None:
+        """Delete an index and invalidate the cached index list."""
+        try:
+            await self.client.indices.delete(index=index, ignore_unavailable=ignore_unavailable)
+        finally:
+            self.invalidate_indices_cache()
+    
     async def simple_search(
         self, 
         index: str, 
         query: Dict[str, Any], 
-        size: int = 10
+        size: int = 10,
+        need_total: bool = True
     ) -> Dict[str, Any]:
-        """Perform simple search on Elasticsearch with enhanced error handling."""
+        """Perform simple search on Elasticsearch with enhanced error handling.
+        
+        Pass ``need_total=False`` when only the first ``size`` documents matter
+        (e.g. chart previews). Elasticsearch then skips exact hit counting, which
+        is noticeably cheaper on large indices, and ``total_hits`` falls back to
+        the number of documents returned.
+        """
         # Input validation
         if not index or not isinstance(index, str):
             raise ValueError("Invalid index name")
@@ -95,23 +167,33 @@ class ElasticsearchService:
         size = max(0, min(settings.max_query_size, size))
         
         try:
+            search_params = {}
+            if not need_total:
+                search_params["track_total_hits"] = False
+            
             response = await self.client.search(
                 index=index,
                 body=query,
                 size=size,
-                timeout="30s"  # Add timeout
+                timeout="30s",  # Add timeout
+                **search_params
             )
             
-            # Handle different total hit formats (ES 7.x vs 8.x)
-            total_hits = response["hits"]["total"]
-            if isinstance(total_hits, dict):
+            data = [hit["_source"] for hit in response["hits"]["hits"]]
+            
+            # Handle different total hit formats (ES 7.x vs 8.x); the total is
+            # omitted entirely when hit tracking is disabled
+            total_hits = response["hits"].get("total")
+            if total_hits is None:
+                total_count = len(data)
+            elif isinstance(total_hits, dict):
                 total_count = total_hits.get("value", 0)
             else:
                 total_count = total_hits
             
             return {
                 "total_hits": total_count,
-                "data": [hit["_source"] for hit in response["hits"]["hits"]],
+                "data": data,
                 "aggregations": response.get("aggregations", {}),
                 "took": response.get("took", 0),
                 "timed_out": response.get("timed_out", False)
@@ -133,6 +215,35 @@ class ElasticsearchService:
                 "error": f"Search failed: {str(e)}"
             }
     
+    async def iter_hits(
+        self,
+        index: str,
+        query: Optional[Dict[str, Any]] = None,
+        size: int = 1000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield document sources one at a time using a scroll.
+        
+        Unlike `simple_search`, results are never materialized as a list, so
+        memory stays flat no matter how many documents match. ``size`` is the
+        number of documents fetched per scroll page.
+        """
+        if not index or not isinstance(index, str):
+            raise ValueError("Invalid index name")
+        
+        try:
+            async for hit in async_scan(
+                self.client,
+                index=index,
+                query=query or {"query": {"match_all": {}}},
+                size=size
+            ):
+                yield hit["_source"]
+        except NotFoundError:
+            logger.error(f"Index '{index}' not found")
+        except Exception as e:
+            logger.error(f"Scan failed for index '{index}': {e}")
+            raise ElasticsearchError(f"Scan failed: {str(e)}", {"index": index})
+    
     async def aggregate_data(
         self, 
         index: str, 
@@ -170,5 +281,22 @@ class ElasticsearchService:
         await self.client.close()
 
 
-# Note: Service instances are now managed by dependency injection
-# See app.core.dependencies for service management 
\ No newline at end of file
+# Process-wide service, shared by the API and the ingestion scripts so they
+# reuse one connection pool
+_shared_service: Optional[ElasticsearchService] = None
+
+
+def get_shared_elasticsearch_service() -> ElasticsearchService:
+    """Return the shared Elasticsearch service, creating it on first use."""
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = ElasticsearchService()
+    return _shared_service
+
+
+async def close_shared_elasticsearch_service() -> None:
+    """Close the shared Elasticsearch service, if it was created."""
+    global _shared_service
+    if _shared_service is not None:
+        await _shared_service.close()
+        _shared_service = None
@@ -5,14 +5,33 @@ import asyncio
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
-import json
-import hashlib
-from collections import defaultdict, Counter
-import numpy as np
-from datetime import datetime, timedelta
+import re
+import heapq
+from operator import itemgetter
+from collections import defaultdict, Counter, OrderedDict
+import time
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Bounds on the in-memory user profiles; the least recently updated profile
+# is dropped first
+MAX_USER_PROFILES = 10_000
+USER_PROFILE_TTL = 24 * 3600  # seconds
+
+# Conversation context lookups for behavior analysis arriving within this
+# many seconds of each other are sent to the vector DB as one batch
+CONTEXT_BATCH_WINDOW = 0.005
+BEHAVIOR_CONTEXT_LIMIT = 10
+
+
+def _remember_recent(recent: OrderedDict[str, None], key: str, limit: int) -> None:
+    """Mark ``key`` as most recently used, keeping at most ``limit`` keys."""
+    recent[key] = None
+    recent.move_to_end(key)
+    while len(recent) > limit:
+        recent.popitem(last=False)
+
 
 class QueryPattern(Enum):
     """Types of query patterns we can recognize."""
@@ -36,7 +55,22 @@ class UserBehavior(Enum):
     CASUAL = "casual"      # Occasional simple queries
 
 
-@dataclass
+# Reasoning shown for each recognized pattern
+PATTERN_REASONING = {
+    QueryPattern.TIME_SERIES_ANALYSIS: "Detected time-based analysis pattern with temporal data focus",
+    QueryPattern.CATEGORICAL_COMPARISON: "Identified categorical comparison pattern for data segmentation",
+    QueryPattern.AGGREGATION_SUMMARY: "Recognized aggregation pattern for data summarization",
+    QueryPattern.CORRELATION_ANALYSIS: "Found correlation analysis pattern for relationship exploration",
+    QueryPattern.DISTRIBUTION_ANALYSIS: "Detected distribution analysis pattern for data spread examination",
+    QueryPattern.TREND_ANALYSIS: "Identified trend analysis pattern for pattern recognition",
+    QueryPattern.ANOMALY_DETECTION: "Recognized anomaly detection pattern for outlier identification",
+    QueryPattern.DRILL_DOWN: "Detected drill-down pattern for detailed exploration",
+    QueryPattern.ROLL_UP: "Identified roll-up pattern for high-level overview",
+    QueryPattern.FILTER_REFINEMENT: "Found filter refinement pattern for data subset analysis"
+}
+
+
+@dataclass(slots=True)
 class QueryInsight:
     """Insights derived from query analysis."""
     pattern: QueryPattern
@@ -47,17 +81,18 @@ class QueryInsight:
     user_behavior_hint: Optional[UserBehavior]
 
 
-@dataclass
+@dataclass(slots=True)
 class UserProfile:
     """User behavior profile based on query history."""
     session_id: str
     behavior_type: UserBehavior
-    preferred_chart_types: List[str]
-    common_fields: List[str]
+    preferred_chart_types: OrderedDict[str, None]  # oldest to most recent
+    common_fields: OrderedDict[str, None]  # oldest to most recent
     query_complexity: float  # 0.0 to 1.0
     domain_expertise: Dict[str, float]  # field -> expertise level
     interaction_patterns: Dict[str, int]
     last_updated: datetime
+    last_updated_ts: float  # time.time() of last_updated, for cheap age checks
 
 
 class QueryIntelligenceService:
@@ -68,7 +103,16 @@ class QueryIntelligenceService:
         self.vector_db_service = vector_db_service
         self.redis_service = redis_service
         self.pattern_rules = self._build_pattern_rules()
-        self.user_profiles = {}  # In-memory cache, could be persisted
+        self._compiled_rules = self._compile_pattern_rules()
+        self._keyword_re, self._keyword_closure = self._build_keyword_matcher()
+        # In-memory cache ordered by last update, could be persisted
+        self.user_profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        # Running total of profile complexities for the metrics average
+        self._complexity_sum = 0.0
+        self._complexity_n = 0
+        # session id -> context lookup waiting for the next batch
+        self._pending_contexts: Dict[str, asyncio.Future] = {}
+        self._context_flush: Optional[asyncio.Task] = None
         
     def _build_pattern_rules(self) -> Dict[QueryPattern, Dict[str, Any]]:
         """Build pattern recognition rules."""
@@ -148,6 +192,56 @@ class QueryIntelligenceService:
             }
         }
     
+    def _compile_pattern_rules(self) -> List[Tuple[QueryPattern, frozenset, float, Tuple[str, ...], frozenset, frozenset, float]]:
+        """Flatten pattern rules into tuples for the per-query scoring loop.
+
+        Each entry is (pattern, keyword set, keyword weight, field types, chart
+        types, aggregation types, confidence boost); the keyword weight is the
+        0.4 keyword share already divided by the number of keywords.
+        """
+        compiled = []
+        for pattern, rules in self.pattern_rules.items():
+            keywords = frozenset(rules.get("keywords", []))
+            compiled.append((
+                pattern,
+                keywords,
+                0.4 / len(keywords) if keywords else 0.0,
+                tuple(rules.get("field_types", [])),
+                frozenset(rules.get("chart_types", [])),
+                frozenset(rules.get("aggregation_types", [])),
+                rules.get("confidence_boost", 0.0)
+            ))
+        return compiled
+    
+    def _build_keyword_matcher(self) -> Tuple[re.Pattern, Dict[str, frozenset]]:
+        """Compile every pattern keyword into a single scanner.
+
+        The lookahead alternation (longest keyword first) reports the longest
+        keyword starting at each position of the message, and the closure maps
+        it to every keyword it contains, so one C-level pass finds the same
+        keywords as a separate substring test per keyword.
+        """
+        keywords = sorted(
+            {kw for rules in self.pattern_rules.values() for kw in rules.get("keywords", [])},
+            key=len,
+            reverse=True
+        )
+        keyword_re = re.compile(
+            "(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))"
+        )
+        closure = {
+            kw: frozenset(other for other in keywords if other in kw)
+            for kw in keywords
+        }
+        return keyword_re, closure
+    
+    def _match_keywords(self, message_lower: str) -> set:
+        """Return the set of pattern keywords that occur in the message."""
+        found = set()
+        for keyword in self._keyword_re.findall(message_lower):
+            found |= self._keyword_closure[keyword]
+        return found
+    
     async def analyze_query_pattern(
         self,
         user_message: str,
@@ -159,22 +253,24 @@ class QueryIntelligenceService:
         
         try:
             # Identify the primary pattern
-            pattern, confidence = self._identify_primary_pattern(user_message, intent_analysis)
+            message_lower = user_message.lower()
+            pattern, confidence = self._identify_primary_pattern(message_lower, intent_analysis)
             
             # Generate reasoning
             reasoning = self._generate_pattern_reasoning(pattern, user_message, intent_analysis)
             
-            # Suggest improvements
-            improvements = await self._suggest_query_improvements(
-                pattern, user_message, intent_analysis, query_results
+            # Suggest improvements and analyze user behavior concurrently; the
+            # behavior analysis waits on the vector DB
+            improvements, user_behavior = await asyncio.gather(
+                self._suggest_query_improvements(
+                    pattern, user_message, intent_analysis, query_results
+                ),
+                self._analyze_user_behavior(session_id, pattern, intent_analysis)
             )
             
             # Find related patterns
             related_patterns = self._find_related_patterns(pattern, intent_analysis)
             
-            # Analyze user behavior
-            user_behavior = await self._analyze_user_behavior(session_id, pattern, intent_analysis)
-            
             return QueryInsight(
                 pattern=pattern,
                 confidence=confidence,
@@ -197,55 +293,52 @@ class QueryIntelligenceService:
     
     def _identify_primary_pattern(
         self,
-        user_message: str,
+        message_lower: str,
         intent_analysis: Dict[str, Any]
     ) -> Tuple[QueryPattern, float]:
-        """Identify the primary query pattern."""
+        """Identify the primary query pattern from the lowercased message."""
         
-        message_lower = user_message.lower()
-        pattern_scores = {}
+        found_keywords = self._match_keywords(message_lower)
+        best_pattern = None
+        best_score = -1.0
         
-        for pattern, rules in self.pattern_rules.items():
+        # Loop-invariant intent values
+        intent_fields = intent_analysis.get("fields", [])
+        intent_fields_str = str(intent_fields).lower() if intent_fields else ""
+        intent_chart = intent_analysis.get("chart_type")
+        intent_agg = intent_analysis.get("aggregation_type")
+        
+        for pattern, keywords, keyword_weight, field_types, chart_types, agg_types, boost in self._compiled_rules:
             score = 0.0
             
             # Keyword matching
-            keywords = rules.get("keywords", [])
-            keyword_matches = sum(1 for keyword in keywords if keyword in message_lower)
             if keywords:
-                score += (keyword_matches / len(keywords)) * 0.4
+                score += len(keywords & found_keywords) * keyword_weight
             
             # Field type matching
-            field_types = rules.get("field_types", [])
-            intent_fields = intent_analysis.get("fields", [])
-            if field_types and intent_fields:
-                # This is simplified - in practice, you'd analyze actual field types
-                field_match = any(ft in str(intent_fields).lower() for ft in field_types)
-                if field_match:
-                    score += 0.3
+            # This is simplified - in practice, you'd analyze actual field types
+            if intent_fields_str and any(ft in intent_fields_str for ft in field_types):
+                score += 0.3
             
             # Chart type matching
-            chart_types = rules.get("chart_types", [])
-            intent_chart = intent_analysis.get("chart_type")
-            if chart_types and intent_chart and intent_chart in chart_types:
+            if intent_chart and intent_chart in chart_types:
                 score += 0.2
             
             # Aggregation type matching
-            agg_types = rules.get("aggregation_types", [])
-            intent_agg = intent_analysis.get("aggregation_type")
-            if agg_types and intent_agg and intent_agg in agg_types:
+            if intent_agg and intent_agg in agg_types:
                 score += 0.1
             
             # Apply confidence boost
             if score > 0:
-                score += rules.get("confidence_boost", 0.0)
+                score += boost
             
-            pattern_scores[pattern] = min(1.0, score)
+            # Keep the highest scoring pattern (first one on ties)
+            score = min(1.0, score)
+            if score > best_score:
+                best_pattern, best_score = pattern, score
         
-        # Find the highest scoring pattern
-        if pattern_scores:
-            best_pattern = max(pattern_scores, key=pattern_scores.get)
-            confidence = pattern_scores[best_pattern]
-            return best_pattern, confidence
+        if best_pattern is not None:
+            return best_pattern, best_score
         
         # Default fallback
         return QueryPattern.CATEGORICAL_COMPARISON, 0.5
@@ -258,20 +351,7 @@ class QueryIntelligenceService:
     ) -> str:
         """Generate reasoning for the identified pattern."""
         
-        reasoning_templates = {
-            QueryPattern.TIME_SERIES_ANALYSIS: "Detected time-based analysis pattern with temporal data focus",
-            QueryPattern.CATEGORICAL_COMPARISON: "Identified categorical comparison pattern for data segmentation",
-            QueryPattern.AGGREGATION_SUMMARY: "Recognized aggregation pattern for data summarization",
-            QueryPattern.CORRELATION_ANALYSIS: "Found correlation analysis pattern for relationship exploration",
-            QueryPattern.DISTRIBUTION_ANALYSIS: "Detected distribution analysis pattern for data spread examination",
-            QueryPattern.TREND_ANALYSIS: "Identified trend analysis pattern for pattern recognition",
-            QueryPattern.ANOMALY_DETECTION: "Recognized anomaly detection pattern for outlier identification",
-            QueryPattern.DRILL_DOWN: "Detected drill-down pattern for detailed exploration",
-            QueryPattern.ROLL_UP: "Identified roll-up pattern for high-level overview",
-            QueryPattern.FILTER_REFINEMENT: "Found filter refinement pattern for data subset analysis"
-        }
-        
-        base_reasoning = reasoning_templates.get(pattern, "Pattern analysis completed")
+        base_reasoning = PATTERN_REASONING.get(pattern, "Pattern analysis completed")
         
         # Add context-specific details
         intent = intent_analysis.get("intent", "unknown")
@@ -392,9 +472,7 @@ class QueryIntelligenceService:
         
         try:
             # Get conversation context
-            context = await self.vector_db_service.get_conversation_context(
-                session_id, "", limit=10
-            )
+            context = await self._get_session_context(session_id)
             
             if not context:
                 return UserBehavior.CASUAL
@@ -418,6 +496,45 @@ class QueryIntelligenceService:
             logger.error(f"Failed to analyze user behavior: {e}")
             return None
     
+    async def _get_session_context(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get a session's conversation context through the batching window."""
+        future = self._pending_contexts.get(session_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending_contexts[session_id] = future
+            if self._context_flush is None:
+                self._context_flush = asyncio.create_task(self._flush_session_contexts())
+        return await asyncio.shield(future)
+    
+    async def _flush_session_contexts(self) -> None:
+        """Fetch every pending session's context in one vector DB call."""
+        await asyncio.sleep(CONTEXT_BATCH_WINDOW)
+        pending = self._pending_contexts
+        self._pending_contexts = {}
+        self._context_flush = None
+        
+        try:
+            batch_fetch = getattr(self.vector_db_service, "get_session_contexts", None)
+            if batch_fetch is not None:
+                contexts = await batch_fetch(list(pending), limit=BEHAVIOR_CONTEXT_LIMIT)
+            else:
+                results = await asyncio.gather(*(
+                    self.vector_db_service.get_conversation_context(
+                        session_id, "", limit=BEHAVIOR_CONTEXT_LIMIT
+                    )
+                    for session_id in pending
+                ))
+                contexts = dict(zip(pending, results))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for session_id, future in pending.items():
+            if not future.done():
+                future.set_result(contexts.get(session_id, []))
+    
     async def update_user_profile(
         self,
         session_id: str,
@@ -433,13 +550,16 @@ class QueryIntelligenceService:
             profile = UserProfile(
                 session_id=session_id,
                 behavior_type=UserBehavior.CASUAL,
-                preferred_chart_types=[],
-                common_fields=[],
+                preferred_chart_types=OrderedDict(),
+                common_fields=OrderedDict(),
                 query_complexity=0.5,
                 domain_expertise={},
                 interaction_patterns={},
-                last_updated=datetime.now()
+                last_updated=datetime.now(),
+                last_updated_ts=time.time()
             )
+            self._complexity_sum += profile.query_complexity
+            self._complexity_n += 1
         
         # Update behavior type
         if query_insight.user_behavior_hint:
@@ -447,21 +567,20 @@ class QueryIntelligenceService:
         
         # Update preferred chart types
         chart_type = intent_analysis.get("chart_type")
-        if chart_type and chart_type not in profile.preferred_chart_types:
-            profile.preferred_chart_types.append(chart_type)
+        if chart_type:
             # Keep only top 5 preferences
-            profile.preferred_chart_types = profile.preferred_chart_types[-5:]
+            _remember_recent(profile.preferred_chart_types, chart_type, 5)
         
         # Update common fields
         fields = intent_analysis.get("fields", [])
         for field in fields:
-            if field not in profile.common_fields:
-                profile.common_fields.append(field)
-        profile.common_fields = profile.common_fields[-10:]  # Keep recent fields
+            _remember_recent(profile.common_fields, field, 10)  # Keep recent fields
         
         # Update query complexity (moving average)
         pattern_complexity = self.pattern_rules.get(query_insight.pattern, {}).get("complexity", 0.5)
-        profile.query_complexity = (profile.query_complexity * 0.8) + (pattern_complexity * 0.2)
+        new_complexity = (profile.query_complexity * 0.8) + (pattern_complexity * 0.2)
+        self._complexity_sum += new_complexity - profile.query_complexity
+        profile.query_complexity = new_complexity
         
         # Update interaction patterns
         pattern_name = query_insight.pattern.value
@@ -474,10 +593,24 @@ class QueryIntelligenceService:
             profile.domain_expertise[index_name] = min(1.0, current_expertise + 0.1)
         
         profile.last_updated = datetime.now()
+        profile.last_updated_ts = time.time()
         self.user_profiles[session_id] = profile
+        self.user_profiles.move_to_end(session_id)
+        self._evict_profiles(profile.last_updated_ts)
         
         return profile
     
+    def _evict_profiles(self, now: float) -> None:
+        """Drop profiles beyond MAX_USER_PROFILES or idle longer than USER_PROFILE_TTL."""
+        expired_before = now - USER_PROFILE_TTL
+        while self.user_profiles:
+            oldest = next(iter(self.user_profiles.values()))
+            if len(self.user_profiles) <= MAX_USER_PROFILES and oldest.last_updated_ts >= expired_before:
+                break
+            self.user_profiles.popitem(last=False)
+            self._complexity_sum -= oldest.query_complexity
+            self._complexity_n -= 1
+    
     async def get_personalized_suggestions(
         self,
         session_id: str,
@@ -485,6 +618,7 @@ class QueryIntelligenceService:
     ) -> List[str]:
         """Get personalized query suggestions based on user profile."""
         
+        self._evict_profiles(time.time())
         profile = self.user_profiles.get(session_id)
         if not profile:
             return self._get_default_suggestions()
@@ -512,11 +646,11 @@ class QueryIntelligenceService:
             ])
         
         # Pattern-based suggestions
-        common_patterns = sorted(
+        common_patterns = heapq.nlargest(
+            3,
             profile.interaction_patterns.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:3]
+            key=itemgetter(1)
+        )
         
         for pattern_name, _ in common_patterns:
             if pattern_name == QueryPattern.TIME_SERIES_ANALYSIS.value:
@@ -526,7 +660,7 @@ class QueryIntelligenceService:
         
         # Field-based suggestions
         if profile.common_fields:
-            field = profile.common_fields[-1]  # Most recent field
+            field = next(reversed(profile.common_fields))  # Most recent field
             suggestions.append(f"Explore {field} data with different visualizations")
         
         return suggestions[:5]  # Return top 5 suggestions
@@ -544,6 +678,8 @@ class QueryIntelligenceService:
     async def get_intelligence_metrics(self) -> Dict[str, Any]:
         """Get intelligence service metrics."""
         
+        now = time.time()
+        self._evict_profiles(now)
         total_profiles = len(self.user_profiles)
         
         # Behavior distribution
@@ -558,19 +694,22 @@ class QueryIntelligenceService:
                 pattern_counts[pattern] += count
         
         # Average complexity
-        avg_complexity = np.mean([
-            profile.query_complexity for profile in self.user_profiles.values()
-        ]) if self.user_profiles else 0.0
+        avg_complexity = self._complexity_sum / self._complexity_n if self._complexity_n else 0.0
+        
+        # Profiles are kept in update order, so count back from the newest
+        # until one falls outside the last hour
+        active_sessions = 0
+        for profile in reversed(self.user_profiles.values()):
+            if now - profile.last_updated_ts >= 3600:
+                break
+            active_sessions += 1
         
         return {
             "total_user_profiles": total_profiles,
             "behavior_distribution": dict(behavior_counts),
             "pattern_distribution": dict(pattern_counts),
             "average_query_complexity": avg_complexity,
-            "active_sessions": len([
-                p for p in self.user_profiles.values()
-                if (datetime.now() - p.last_updated).seconds < 3600  # Active in last hour
-            ])
+            "active_sessions": active_sessions  # Active in last hour
         }
 
 
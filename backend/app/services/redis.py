@@ -1,32 +1,61 @@
-import json
-from typing import Any, Optional
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
 import logging
 
 from app.core.config import settings
 from app.core.exceptions import RedisError
 from app.core.constants import CACHE_KEYS
+from app.utils.serialization import dumpb, loads
 
 logger = logging.getLogger(__name__)
 
+# In-process cache of hot query results in front of Redis; the short TTL
+# bounds how stale a worker's copy can get after another worker rewrites it
+LOCAL_QUERY_CACHE_SIZE = 1024
+LOCAL_QUERY_CACHE_TTL = 60.0
+
+# First characters a JSON document can start with; other values are plain
+# strings and skip the parse attempt
+_JSON_START_CHARS = frozenset('{["-0123456789tfn')
+
+# Every cache key template ends with its single placeholder, so keys are
+# built by concatenating the fixed prefix instead of str.format per call
+_SESSION_KEY_PREFIX = CACHE_KEYS["session"].partition("{")[0]
+_QUERY_KEY_PREFIX = CACHE_KEYS["query"].partition("{")[0]
+
 
 class RedisService:
     """Redis service for caching and session management."""
     
     def __init__(self):
         """Initialize Redis client."""
-        # Initialize Redis client
-        self.client = redis.Redis(
+        # Explicit pool so concurrent handlers are not queued behind the
+        # client's default connection limit
+        self._pool = redis.ConnectionPool(
             host=settings.redis_host,
             port=settings.redis_port,
             db=settings.redis_db,
             password=settings.redis_password,
             decode_responses=True,
+            max_connections=settings.redis_max_connections,
             socket_connect_timeout=5,
             socket_timeout=5,
-            retry_on_timeout=True,
+            socket_keepalive=True,
+            # Retries connection errors and timeouts with exponential backoff
+            retry=Retry(ExponentialBackoff(), 3),
             health_check_interval=30
         )
+        self.client = redis.Redis(connection_pool=self._pool)
+        
+        # query hash -> (expiry on the monotonic clock, result)
+        self._local_queries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # query hash -> pending Redis lookup shared by concurrent misses
+        self._inflight_queries: Dict[str, asyncio.Future] = {}
         
         logger.info(f"Redis client initialized: {settings.redis_host}:{settings.redis_port}")
     
@@ -39,11 +68,28 @@ class RedisService:
             logger.error(f"Redis health check failed: {e}")
             return False
     
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        """Encode dicts and lists as JSON; other values are stored as-is."""
+        if isinstance(value, (dict, list)):
+            # Encoded bytes are sent as-is, skipping redis-py's str encode
+            return dumpb(value)
+        return value
+    
+    @staticmethod
+    def _decode(value: Optional[str]) -> Optional[Any]:
+        """Parse a stored value as JSON, falling back to the raw string."""
+        if not value or value[0] not in _JSON_START_CHARS:
+            return value
+        try:
+            return loads(value)
+        except ValueError:
+            return value
+    
     async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
         """Set a key-value pair with optional expiration."""
         try:
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
+            value = self._encode(value)
             
             if expire:
                 return await self.client.setex(key, expire, value)
@@ -56,19 +102,40 @@ class RedisService:
     async def get(self, key: str) -> Optional[Any]:
         """Get value by key."""
         try:
-            value = await self.client.get(key)
-            if value is None:
-                return None
-            
-            # Try to parse as JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            return self._decode(await self.client.get(key))
         except Exception as e:
             logger.error(f"Failed to get key '{key}': {e}")
             return None
     
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several keys in one round-trip, returning None for missing keys."""
+        if not keys:
+            return []
+        try:
+            values = await self.client.mget(keys)
+            return [self._decode(value) for value in values]
+        except Exception as e:
+            logger.error(f"Failed to get {len(keys)} keys: {e}")
+            return [None] * len(keys)
+    
+    async def mset(self, mapping: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        """Set several key-value pairs in one pipelined round-trip."""
+        if not mapping:
+            return True
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                value = self._encode(value)
+                if expire:
+                    pipe.setex(key, expire, value)
+                else:
+                    pipe.set(key, value)
+            results = await pipe.execute()
+            return all(results)
+        except Exception as e:
+            logger.error(f"Failed to set {len(mapping)} keys: {e}")
+            return False
+    
     async def delete(self, key: str) -> bool:
         """Delete a key."""
         try:
@@ -88,18 +155,18 @@ class RedisService:
     
     async def set_session(self, session_id: str, data: dict, expire: Optional[int] = None) -> bool:
         """Set session data with expiration."""
-        key = CACHE_KEYS["session"].format(session_id=session_id)
+        key = _SESSION_KEY_PREFIX + session_id
         expire = expire or settings.session_ttl
         return await self.set(key, data, expire)
     
     async def get_session(self, session_id: str) -> Optional[dict]:
         """Get session data."""
-        key = CACHE_KEYS["session"].format(session_id=session_id)
+        key = _SESSION_KEY_PREFIX + session_id
         return await self.get(key)
     
     async def delete_session(self, session_id: str) -> bool:
         """Delete session data."""
-        key = CACHE_KEYS["session"].format(session_id=session_id)
+        key = _SESSION_KEY_PREFIX + session_id
         return await self.delete(key)
     
     async def cache_query_result(
@@ -109,29 +176,108 @@ class RedisService:
         expire: Optional[int] = None
     ) -> bool:
         """Cache query result with expiration."""
-        key = CACHE_KEYS["query"].format(query_hash=query_hash)
+        key = _QUERY_KEY_PREFIX + query_hash
         expire = expire or settings.query_cache_ttl
+        self._remember_query(query_hash, result, expire)
         return await self.set(key, result, expire)
     
     async def get_cached_query(self, query_hash: str) -> Optional[dict]:
-        """Get cached query result."""
-        key = CACHE_KEYS["query"].format(query_hash=query_hash)
-        return await self.get(key)
+        """Get cached query result.
+
+        Recently seen results are answered from an in-process LRU without a
+        Redis round-trip, and concurrent misses for the same hash wait on a
+        single Redis lookup. Results are shared between callers, so treat them
+        as read-only.
+        """
+        entry = self._local_queries.get(query_hash)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._local_queries.move_to_end(query_hash)
+                return entry[1]
+            del self._local_queries[query_hash]
+        
+        inflight = self._inflight_queries.get(query_hash)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The lookup we piggybacked on was cancelled; treat it as a miss
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    return None
+                raise
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_queries[query_hash] = future
+        try:
+            key = _QUERY_KEY_PREFIX + query_hash
+            result = await self.get(key)
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight_queries.pop(query_hash, None)
+        
+        if result is not None:
+            self._remember_query(query_hash, result)
+        future.set_result(result)
+        return result
     
-    async def clear_cache_pattern(self, pattern: str) -> int:
-        """Clear cache entries matching pattern."""
+    def _remember_query(self, query_hash: str, result: Any, expire: Optional[float] = None) -> None:
+        """Store a query result in the in-process LRU."""
+        ttl = min(expire, LOCAL_QUERY_CACHE_TTL) if expire else LOCAL_QUERY_CACHE_TTL
+        self._local_queries[query_hash] = (time.monotonic() + ttl, result)
+        self._local_queries.move_to_end(query_hash)
+        if len(self._local_queries) > LOCAL_QUERY_CACHE_SIZE:
+            self._local_queries.popitem(last=False)
+    
+    async def get_cached_queries(self, query_hashes: List[str]) -> List[Optional[dict]]:
+        """Get cached query results for several hashes in one round-trip."""
+        keys = [_QUERY_KEY_PREFIX + query_hash for query_hash in query_hashes]
+        return await self.mget(keys)
+    
+    async def cache_query_results(
+        self,
+        results: Dict[str, dict],
+        expire: Optional[int] = None
+    ) -> bool:
+        """Cache several query results, keyed by query hash, in one round-trip."""
+        expire = expire or settings.query_cache_ttl
+        mapping = {}
+        for query_hash, result in results.items():
+            self._remember_query(query_hash, result, expire)
+            mapping[_QUERY_KEY_PREFIX + query_hash] = result
+        return await self.mset(mapping, expire)
+    
+    async def clear_cache_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """Clear cache entries matching pattern.
+
+        Keys are found with incremental SCAN and removed with UNLINK in
+        batches, so neither the lookup nor the memory reclamation blocks the
+        Redis server the way KEYS and DEL do on a large keyspace.
+        """
+        # Matching query results must not be served from the local copy
+        self._local_queries.clear()
+        
+        deleted = 0
+        batch = []
         try:
-            keys = await self.client.keys(pattern)
-            if keys:
-                return await self.client.delete(*keys)
-            return 0
+            async for key in self.client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += await self.client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                deleted += await self.client.unlink(*batch)
+            return deleted
         except Exception as e:
             logger.error(f"Failed to clear cache pattern '{pattern}': {e}")
-            return 0
+            return deleted
     
     async def close(self):
         """Close Redis connection."""
         await self.client.close()
+        # A client given an explicit pool leaves it open on close
+        await self._pool.disconnect()
 
 
 # Note: Service instances are now managed by dependency injection
@@ -0,0 +1,130 @@
+"""In-memory semantic cache keyed by text embeddings."""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Cache that returns stored values for texts with similar embeddings.
+
+    Entries are partitioned by a namespace (e.g. a search and its limits) and
+    matched by cosine similarity of L2-normalized text embeddings. The cache
+    is small enough that a brute-force numpy dot product beats an ANN index.
+    ``embedding_fn`` is expected to memoize its results, since the same text
+    is usually embedded elsewhere in the request as well. It may be a
+    coroutine function, which is awaited on the event loop; a blocking one is
+    run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        embedding_fn: Callable[[str], Union[List[float], Awaitable[List[float]]]],
+        dim: int = 384,
+        threshold: float = 0.85,
+        replace_threshold: float = 0.95,
+        ttl: float = 300.0,
+        max_entries: int = 1024
+    ):
+        """Initialize the cache with an embedding function and its output size."""
+        self.embedding_fn = embedding_fn
+        self._embedding_fn_is_async = inspect.iscoroutinefunction(embedding_fn)
+        self.dim = dim
+        self.threshold = threshold
+        self.replace_threshold = replace_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # Fixed-size slot storage; a slot is free when its expiry is 0
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._namespaces = np.full(max_entries, None, dtype=object)
+        self._values: List[Any] = [None] * max_entries
+
+    def _normalize(self, embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        """L2-normalize an embedding, or return None if it is unusable."""
+        if embedding is None or len(embedding) != self.dim:
+            return None
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed text and L2-normalize it."""
+        return self._normalize(self.embedding_fn(text))
+
+    async def _embed_async(self, text: str) -> Optional[np.ndarray]:
+        """Embed text without blocking the event loop."""
+        try:
+            if self._embedding_fn_is_async:
+                return self._normalize(await self.embedding_fn(text))
+            return await asyncio.to_thread(self._embed, text)
+        except Exception as e:
+            logger.warning("Semantic cache embedding failed: %s", e)
+            return None
+
+    def _best_match(self, namespace: str, vector: np.ndarray, now: float):
+        """Return (slot, similarity) of the closest live entry in the namespace."""
+        live = (self._expires_at > now) & (self._namespaces == namespace)
+        if not live.any():
+            return None, -1.0
+
+        similarities = self._vectors @ vector
+        similarities[~live] = -1.0
+
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    async def get(self, namespace: str, text: str) -> Optional[Any]:
+        """Return a cached response for a semantically similar prompt, if any."""
+        vector = await self._embed_async(text)
+        if vector is None:
+            return None
+
+        now = time.monotonic()
+        slot, similarity = self._best_match(namespace, vector, now)
+        if slot is None or similarity < self.threshold:
+            return None
+
+        self._last_used[slot] = now
+        logger.debug("Semantic cache hit (similarity: %.3f)", similarity)
+        return self._values[slot]
+
+    async def put(self, namespace: str, text: str, value: Any) -> None:
+        """Store a response, replacing a near-duplicate entry when present."""
+        vector = await self._embed_async(text)
+        if vector is None:
+            return
+
+        now = time.monotonic()
+        slot, similarity = self._best_match(namespace, vector, now)
+        if slot is None or similarity < self.replace_threshold:
+            free_slots = np.flatnonzero(self._expires_at <= now)
+            if free_slots.size:
+                slot = int(free_slots[0])
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self._last_used))
+
+        self._vectors[slot] = vector
+        self._expires_at[slot] = now + self.ttl
+        self._last_used[slot] = now
+        self._namespaces[slot] = namespace
+        self._values[slot] = value
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._expires_at[:] = 0.0
+        self._last_used[:] = 0.0
+        self._namespaces[:] = None
+        self._values = [None] * self.max_entries
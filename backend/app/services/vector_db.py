@@ -2,41 +2,224 @@
 
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
-from functools import lru_cache
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import heapq
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import hashlib
 import json
 
 from app.core.config import settings
 from app.core.exceptions import ServiceUnavailableError
+from app.services.semantic_cache import SemanticCache
+from app.utils.serialization import dumps, loads
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_CACHE_SIZE = 4096
+
+# Concurrent embedding requests arriving within this many seconds are encoded
+# in one forward pass
+EMBEDDING_BATCH_WINDOW = 0.005
+EMBEDDING_BATCH_SIZE = 32
+
+# Search results for (near-)identical text are reused for a short while;
+# the high threshold only matches rephrasings with the same meaning
+SEARCH_CACHE_THRESHOLD = 0.97
+SEARCH_CACHE_TTL = 60.0
+# Results for byte-identical (after trimming and lowercasing) text are looked
+# up before the semantic cache, without embedding anything
+EXACT_CACHE_SIZE = 4096
+
+CHROMA_IO_WORKERS = 8
+
+# Index settings for new collections: inner-product distance on the unit
+# embeddings, and a denser HNSW graph (more links, a wider build search)
+# so a narrower query-time search keeps recall
+HNSW_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Health probes and stats requests within this many seconds share one result
+HEALTH_CHECK_TTL = 2.0
+STATS_CACHE_TTL = 5.0
+
+# Documents are written to Chroma in batches: after this many seconds, or as
+# soon as a collection has this many pending documents
+WRITE_BATCH_WINDOW = 0.1
+WRITE_BATCH_SIZE = 64
+
+# Conversation context of recently active sessions is ranked in memory
+# instead of through a metadata-filtered Chroma query. Sessions with more
+# entries than this fall back to Chroma.
+SESSION_CACHE_SIZE = 256
+SESSION_CACHE_MAX_ENTRIES = 1000
+
+# Embedded at startup so the model's first forward pass, and these common
+# questions, are not paid for by a user request
+WARMUP_PROMPTS = (
+    "Show me all data",
+    "Show me the latest data",
+    "Show me sales trends by region this quarter",
+    "Show me the top performing products",
+    "Create a bar chart of sales by region",
+    "Create a pie chart of sales by category",
+    "What's the total revenue?",
+    "What's the average response time today?",
+    "Find all errors in the last 24 hours",
+    "Show me error logs by service",
+)
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+# Dynamically int8-quantized ONNX export published with the model; only used
+# when onnxruntime is installed
+EMBEDDING_ONNX_FILE = 'onnx/model_quint8_avx2.onnx'
+
+
+def _load_embedding_model() -> SentenceTransformer:
+    """Load the embedding model, preferring the quantized ONNX runtime.
+
+    The int8 ONNX graph runs noticeably faster on CPU than PyTorch eager mode.
+    Without onnxruntime (or on a sentence-transformers release without the
+    ONNX backend) the regular PyTorch model is used. Files come from
+    ``settings.embedding_model_dir`` when set, so all workers share them.
+    """
+    cache_folder = settings.embedding_model_dir
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:  # onnxruntime is an optional speedup
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, cache_folder=cache_folder)
+    
+    try:
+        return SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            backend="onnx",
+            cache_folder=cache_folder,
+            model_kwargs={"file_name": EMBEDDING_ONNX_FILE}
+        )
+    except Exception as e:
+        logger.warning(f"Quantized ONNX embedding model unavailable, using PyTorch: {e}")
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, cache_folder=cache_folder)
+
+
+def _load_payload(metadata: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode the nested fields of a stored document.
+
+    Scalar fields are stored as native Chroma metadata and nested ones in a
+    single JSON ``payload`` string. Documents written by earlier versions
+    hold one JSON string per nested field instead.
+    """
+    payload = metadata.get("payload")
+    if payload is not None:
+        values = loads(payload)
+        return {name: values.get(name, default) for name, default in defaults.items()}
+    
+    return {
+        name: loads(metadata[name]) if name in metadata else default
+        for name, default in defaults.items()
+    }
+
+
+@dataclass(slots=True)
+class _SessionContext:
+    """Stored conversation context of one session, one embedding row per entry."""
+    ids: List[str] = field(default_factory=list)
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    embeddings: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float32))
+    
+    def upsert(self, item_id: str, embedding: np.ndarray, document: Dict[str, Any]) -> None:
+        """Add an entry, replacing the one with the same ID like Chroma does."""
+        try:
+            index = self.ids.index(item_id)
+        except ValueError:
+            self.embeddings = (
+                np.vstack((self.embeddings, embedding)) if self.ids else embedding[np.newaxis, :].copy()
+            )
+            self.ids.append(item_id)
+            self.documents.append(document)
+        else:
+            self.documents[index] = document
+            self.embeddings[index] = embedding
+
 
 class VectorDBService:
     """ChromaDB service for semantic search and query memory."""
     
     def __init__(self):
         """Initialize ChromaDB client and embedding model."""
+        # The same user message is embedded several times per request
+        # (similar queries, conversation context, storage, response cache).
+        # Filled from executor threads as well, hence the lock.
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        
+        # text -> embedding request waiting for the next batch
+        self._pending_embeddings: Dict[str, asyncio.Future] = {}
+        self._embedding_flush: Optional[asyncio.Task] = None
+        
+        # Chroma calls and model inference get separate executors so encoding
+        # never waits behind, or competes for cores with, collection I/O. A
+        # single encoder thread leaves intra-op parallelism to the model.
+        self._io_pool = ThreadPoolExecutor(max_workers=CHROMA_IO_WORKERS, thread_name_prefix="chroma-io")
+        self._encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        
+        # (namespace, normalized text) -> (expiry, search results), in LRU order
+        self._exact_cache: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        
+        # (fetched at, value) of the last heartbeat and collection counts; the
+        # locks make concurrent callers wait for one refresh
+        self._health_cache: Optional[Tuple[float, bool]] = None
+        self._health_lock = asyncio.Lock()
+        self._stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._stats_lock = asyncio.Lock()
+        
+        # collection name -> documents waiting for the next batched upsert
+        self._write_buffers: Dict[str, List[Tuple[str, np.ndarray, Dict[str, Any]]]] = {}
+        self._write_flush: Optional[asyncio.Task] = None
+        
+        # session_id -> in-memory copy of its conversation context, in LRU
+        # order (None for sessions too large to rank in memory); sessions
+        # being loaded collect concurrent writes separately
+        self._session_cache: "OrderedDict[str, Optional[_SessionContext]]" = OrderedDict()
+        self._session_loads: Dict[str, List[Tuple[str, np.ndarray, Dict[str, Any]]]] = {}
+        
         try:
             # Initialize ChromaDB client with new configuration
             self.client = chromadb.PersistentClient(path="./chroma_db")
             
             # Initialize embedding model
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = _load_embedding_model()
             
             # Create collections
             self._initialize_collections()
             
+            # Lookups embed through the batched, cache-first path used by the
+            # searches themselves, so the query is encoded once
+            self._search_cache = SemanticCache(
+                self._embed,
+                threshold=SEARCH_CACHE_THRESHOLD,
+                replace_threshold=SEARCH_CACHE_THRESHOLD,
+                ttl=SEARCH_CACHE_TTL
+            )
+            
             logger.info("ChromaDB service initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize ChromaDB service: {e}")
             self.client = None
             self.embedding_model = None
+            self._search_cache = None
     
     def _initialize_collections(self):
         """Initialize ChromaDB collections."""
@@ -44,21 +227,36 @@ class VectorDBService:
             # Collection for storing query examples and patterns
             self.query_collection = self.client.get_or_create_collection(
                 name="query_examples",
-                metadata={"description": "Natural language query examples with ES DSL mappings"}
+                metadata={"description": "Natural language query examples with ES DSL mappings", **HNSW_METADATA}
             )
             
             # Collection for storing conversation context
             self.context_collection = self.client.get_or_create_collection(
                 name="conversation_context",
-                metadata={"description": "Conversation context and user preferences"}
+                metadata={"description": "Conversation context and user preferences", **HNSW_METADATA}
             )
             
             # Collection for storing data schema information
             self.schema_collection = self.client.get_or_create_collection(
                 name="data_schemas",
-                metadata={"description": "Elasticsearch index schemas and field mappings"}
+                metadata={"description": "Elasticsearch index schemas and field mappings", **HNSW_METADATA}
             )
             
+            self._collections = {
+                collection.name: collection
+                for collection in (self.query_collection, self.context_collection, self.schema_collection)
+            }
+            
+            # The distance space is fixed when a collection is created, so
+            # collections persisted by earlier versions still use L2
+            self._collection_spaces = {
+                name: (collection.metadata or {}).get("hnsw:space", "l2")
+                for name, collection in self._collections.items()
+            }
+            for name, space in self._collection_spaces.items():
+                if space != "ip":
+                    logger.warning(f"Collection {name} uses {space} distance; recreate it to use inner product")
+            
             logger.info("ChromaDB collections initialized")
             
         except Exception as e:
@@ -66,38 +264,262 @@ class VectorDBService:
             raise
     
     async def health_check(self) -> bool:
-        """Check if ChromaDB service is healthy."""
+        """Check if ChromaDB service is healthy, served from a short-lived cache."""
         if not self.client or not self.embedding_model:
             return False
         
-        try:
-            # Test basic operations
-            await asyncio.get_event_loop().run_in_executor(
-                None, self.client.heartbeat
-            )
-            return True
-        except Exception as e:
-            logger.error(f"ChromaDB health check failed: {e}")
-            return False
+        async with self._health_lock:
+            if self._health_cache is not None:
+                checked_at, healthy = self._health_cache
+                if time.monotonic() - checked_at < HEALTH_CHECK_TTL:
+                    return healthy
+            
+            try:
+                # Test basic operations
+                await asyncio.get_running_loop().run_in_executor(
+                    self._io_pool, self.client.heartbeat
+                )
+                healthy = True
+            except Exception as e:
+                logger.error(f"ChromaDB health check failed: {e}")
+                healthy = False
+            
+            self._health_cache = (time.monotonic(), healthy)
+            return healthy
     
     async def close(self):
         """Close ChromaDB connections."""
         try:
+            if self._write_flush is not None:
+                self._write_flush.cancel()
+                self._write_flush = None
+            await self.flush()
+            
             if self.client:
                 # ChromaDB doesn't have explicit close method
                 # Data is persisted automatically
                 logger.info("ChromaDB service closed")
+            self._io_pool.shutdown(wait=False)
+            self._encode_pool.shutdown(wait=False)
         except Exception as e:
             logger.error(f"Error closing ChromaDB: {e}")
     
-    def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text."""
+    async def warmup(self, prompts: Sequence[str] = WARMUP_PROMPTS) -> None:
+        """Embed ``prompts`` into the embedding cache with one batched encode.
+        
+        Also runs the model's first inference, which is much slower than the
+        following ones, ahead of any user request.
+        """
+        if not self.embedding_model or not prompts:
+            return
+        
         try:
-            embedding = self.embedding_model.encode(text, convert_to_tensor=False)
-            return embedding.tolist()
+            await asyncio.get_running_loop().run_in_executor(
+                self._encode_pool, self._embed_cached, list(prompts)
+            )
+            logger.info(f"Embedding model warmed up with {len(prompts)} prompts")
+        except Exception as e:
+            logger.warning(f"Embedding warmup failed: {e}")
+    
+    def _encode_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Encode texts with the embedding model in a single call."""
+        embeddings = np.asarray(
+            self.embedding_model.encode(
+                texts,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True
+            ),
+            dtype=np.float32
+        )
+        # Cached arrays are shared between callers, so they must stay immutable
+        embeddings.setflags(write=False)
+        return list(embeddings)
+    
+    def _embed_cached(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts, encoding only the ones not already cached."""
+        found: Dict[str, np.ndarray] = {}
+        with self._embedding_cache_lock:
+            for text in texts:
+                embedding = self._embedding_cache.get(text)
+                if embedding is not None:
+                    self._embedding_cache.move_to_end(text)
+                    found[text] = embedding
+        
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            encoded = self._encode_batch(missing)
+            with self._embedding_cache_lock:
+                for text, embedding in zip(missing, encoded):
+                    self._embedding_cache[text] = embedding
+                    found[text] = embedding
+                while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                    self._embedding_cache.popitem(last=False)
+        
+        return [found[text] for text in texts]
+    
+    def _generate_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Generate a read-only float32 embedding for text, or None on failure."""
+        try:
+            return self._embed_cached([text])[0]
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
+            return None
+    
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed text for any method of this service.
+        
+        Texts already in the shared embedding cache are returned at once,
+        without waiting for a batch; misses are batched with concurrent
+        requests.
+        """
+        with self._embedding_cache_lock:
+            embedding = self._embedding_cache.get(text)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(text)
+                return embedding
+        
+        future = self._pending_embeddings.get(text)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending_embeddings[text] = future
+            if self._embedding_flush is None:
+                self._embedding_flush = asyncio.create_task(self._flush_embeddings())
+        return await asyncio.shield(future)
+    
+    async def _flush_embeddings(self) -> None:
+        """Encode every pending text in one executor call and resolve the waiters."""
+        await asyncio.sleep(EMBEDDING_BATCH_WINDOW)
+        pending = self._pending_embeddings
+        self._pending_embeddings = {}
+        self._embedding_flush = None
+        
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                self._encode_pool, self._embed_cached, list(pending)
+            )
+            results = embeddings
+        except Exception as e:
+            logger.error(f"Failed to generate {len(pending)} embeddings: {e}")
+            results = [None] * len(pending)
+        
+        for future, result in zip(pending.values(), results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def _queue_upsert(
+        self,
+        collection,
+        item_id: str,
+        embedding: np.ndarray,
+        document: Dict[str, Any]
+    ) -> None:
+        """Buffer a document for the next batched upsert into ``collection``."""
+        buffer = self._write_buffers.setdefault(collection.name, [])
+        buffer.append((item_id, embedding, document))
+        
+        if len(buffer) >= WRITE_BATCH_SIZE:
+            await self.flush()
+        elif self._write_flush is None:
+            self._write_flush = asyncio.create_task(self._flush_after_window())
+    
+    async def _flush_after_window(self) -> None:
+        """Flush buffered documents once the batching window has passed."""
+        await asyncio.sleep(WRITE_BATCH_WINDOW)
+        self._write_flush = None
+        await self.flush()
+    
+    async def flush(self) -> None:
+        """Write all buffered documents to Chroma, one upsert per collection.
+
+        The ``store_*`` methods return once their document is buffered; call
+        this when a following read must see those writes.
+        """
+        buffers = self._write_buffers
+        self._write_buffers = {}
+        
+        for name, items in buffers.items():
+            # Chroma rejects repeated IDs within one upsert; the latest document wins
+            latest = {item_id: (embedding, document) for item_id, embedding, document in items}
+            ids = list(latest)
+            embeddings = np.stack([embedding for embedding, _ in latest.values()])
+            collection = self._collections[name]
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._io_pool,
+                    partial(
+                        collection.upsert,
+                        ids=ids,
+                        embeddings=embeddings,
+                        metadatas=[document for _, document in latest.values()]
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Failed to write {len(latest)} documents to {name}: {e}")
+                continue
+            
+            logger.info(f"Wrote {len(latest)} documents to {name}")
+            if name == self.schema_collection.name:
+                # Cached schema lookups may now be out of date
+                self._search_cache.clear()
+                self._exact_cache.clear()
+    
+    async def _get_cached_search(self, namespace: str, text: str) -> Optional[Any]:
+        """Return cached search results for identical or near-identical text."""
+        key = (namespace, text.strip().lower())
+        entry = self._exact_cache.get(key)
+        if entry is not None:
+            expires_at, results = entry
+            if expires_at > time.monotonic():
+                self._exact_cache.move_to_end(key)
+                return results
+            del self._exact_cache[key]
+        
+        return await self._search_cache.get(namespace, text)
+    
+    async def _cache_search(self, namespace: str, text: str, results: Any) -> None:
+        """Remember search results for ``text`` in both cache layers."""
+        self._exact_cache[(namespace, text.strip().lower())] = (time.monotonic() + SEARCH_CACHE_TTL, results)
+        while len(self._exact_cache) > EXACT_CACHE_SIZE:
+            self._exact_cache.popitem(last=False)
+        
+        await self._search_cache.put(namespace, text, results)
+    
+    def _similarity(self, collection, distance: float) -> float:
+        """Convert a Chroma distance for ``collection`` into cosine similarity."""
+        if self._collection_spaces.get(collection.name) == "l2":
+            # Squared L2 between unit vectors is 2 - 2 * cosine
+            return 1.0 - distance / 2.0
+        return 1.0 - distance
+    
+    async def _search_collection(
+        self,
+        collection,
+        query_embedding: np.ndarray,
+        limit: int
+    ) -> List[Tuple[str, Dict[str, Any], float]]:
+        """Find the ``limit`` most similar documents as ``(id, metadata, similarity)``."""
+        if limit <= 0:
+            return []
+        
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._io_pool,
+            partial(
+                collection.query,
+                query_embeddings=[query_embedding],
+                n_results=limit,
+                include=["metadatas", "distances"]
+            )
+        )
+        if not results.get("ids") or not results["ids"][0]:
             return []
+        
+        return [
+            (item_id, metadata or {}, self._similarity(collection, distance))
+            for item_id, metadata, distance in zip(
+                results["ids"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
     
     async def store_query_example(
         self,
@@ -111,39 +533,34 @@ class VectorDBService:
         """Store a query example for future semantic search."""
         try:
             # Generate unique ID
-            query_id = hashlib.md5(
-                f"{natural_query}_{json.dumps(elasticsearch_query, sort_keys=True)}".encode()
-            ).hexdigest()
+            # The canonical (key-sorted) stdlib encoding keeps IDs of already
+            # stored examples stable
+            query_json = json.dumps(elasticsearch_query, sort_keys=True)
+            query_id = hashlib.md5(f"{natural_query}_{query_json}".encode()).hexdigest()
             
             # Generate embedding
-            embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, natural_query
-            )
+            embedding = await self._embed(natural_query)
             
-            if not embedding:
+            if embedding is None:
                 logger.error("Failed to generate embedding for query")
                 return None
             
             # Prepare document
             document = {
                 "natural_query": natural_query,
-                "elasticsearch_query": json.dumps(elasticsearch_query),
                 "intent": intent,
                 "index_name": index_name,
                 "result_count": result_count,
-                "metadata": json.dumps(metadata or {})
+                "payload": dumps({
+                    "elasticsearch_query": elasticsearch_query,
+                    "metadata": metadata or {}
+                })
             }
             
-            # Store in ChromaDB
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.query_collection.upsert,
-                [query_id],
-                [embedding],
-                [document]
-            )
+            # Store in ChromaDB with the next batched write
+            await self._queue_upsert(self.query_collection, query_id, embedding, document)
             
-            logger.info(f"Stored query example: {query_id}")
+            logger.debug(f"Stored query example: {query_id}")
             return query_id
             
         except Exception as e:
@@ -161,44 +578,37 @@ class VectorDBService:
             if not self.client or not self.embedding_model:
                 return []
             
+            cache_namespace = f"similar_queries:{limit}:{similarity_threshold}"
+            cached = await self._get_cached_search(cache_namespace, natural_query)
+            if cached is not None:
+                return cached
+            
             # Generate embedding for query
-            query_embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, natural_query
-            )
+            query_embedding = await self._embed(natural_query)
             
-            if not query_embedding:
+            if query_embedding is None:
                 return []
             
             # Search for similar queries
-            results = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.query_collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=limit
-                )
-            )
+            results = await self._search_collection(self.query_collection, query_embedding, limit)
             
             similar_queries = []
             
-            if results and results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    distance = results['distances'][0][i] if results['distances'] else 1.0
-                    similarity = 1.0 - distance  # Convert distance to similarity
-                    
-                    if similarity >= similarity_threshold:
-                        metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                        
-                        similar_queries.append({
-                            "id": results['ids'][0][i],
-                            "natural_query": metadata.get("natural_query", ""),
-                            "elasticsearch_query": json.loads(metadata.get("elasticsearch_query", "{}")),
-                            "intent": metadata.get("intent", "unknown"),
-                            "index_name": metadata.get("index_name", ""),
-                            "similarity": similarity,
-                            "metadata": json.loads(metadata.get("metadata", "{}"))
-                        })
+            for query_id, metadata, similarity in results:
+                if similarity >= similarity_threshold:
+                    payload = _load_payload(metadata, {"elasticsearch_query": {}, "metadata": {}})
+                    similar_queries.append({
+                        "id": query_id,
+                        "natural_query": metadata.get("natural_query", ""),
+                        "elasticsearch_query": payload["elasticsearch_query"],
+                        "intent": metadata.get("intent", "unknown"),
+                        "index_name": metadata.get("index_name", ""),
+                        "similarity": similarity,
+                        "metadata": payload["metadata"]
+                    })
             
             logger.info(f"Found {len(similar_queries)} similar queries for: {natural_query}")
+            await self._cache_search(cache_namespace, natural_query, similar_queries)
             return similar_queries
             
         except Exception as e:
@@ -222,11 +632,9 @@ class VectorDBService:
             context_text = f"User: {user_message}\nAgent: {agent_response}"
             
             # Generate embedding
-            embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, context_text
-            )
+            embedding = await self._embed(context_text)
             
-            if not embedding:
+            if embedding is None:
                 return None
             
             # Prepare document
@@ -235,20 +643,16 @@ class VectorDBService:
                 "user_message": user_message,
                 "agent_response": agent_response,
                 "intent": intent,
-                "query_result": json.dumps(query_result or {}),
-                "context_text": context_text
+                "context_text": context_text,
+                "timestamp": time.time(),
+                "payload": dumps({"query_result": query_result or {}})
             }
             
-            # Store in ChromaDB
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.context_collection.upsert,
-                [context_id],
-                [embedding],
-                [document]
-            )
+            # Store in ChromaDB with the next batched write
+            await self._queue_upsert(self.context_collection, context_id, embedding, document)
+            self._remember_session_context(session_id, context_id, embedding, document)
             
-            logger.info(f"Stored conversation context: {context_id}")
+            logger.debug(f"Stored conversation context: {context_id}")
             return context_id
             
         except Exception as e:
@@ -267,43 +671,208 @@ class VectorDBService:
                 return []
             
             # Generate embedding for current message
-            query_embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, current_message
-            )
+            query_embedding = await self._embed(current_message)
             
-            if not query_embedding:
+            if query_embedding is None:
                 return []
             
+            if session_id in self._session_cache:
+                self._session_cache.move_to_end(session_id)
+                session = self._session_cache[session_id]
+            else:
+                session = await self._load_session_context(session_id)
+            
+            if session is not None:
+                return self._rank_session_context(session, query_embedding, limit)
+            
             # Search for relevant context
-            results = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.context_collection.query(
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._io_pool,
+                partial(
+                    self.context_collection.query,
                     query_embeddings=[query_embedding],
                     n_results=limit,
-                    where={"session_id": session_id}  # Filter by session
+                    where={"session_id": session_id},  # Filter by session
+                    # Everything is read from the metadata; skip the documents
+                    include=["metadatas", "distances"]
                 )
             )
             
-            context_items = []
-            
-            if results and results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    
-                    context_items.append({
-                        "user_message": metadata.get("user_message", ""),
-                        "agent_response": metadata.get("agent_response", ""),
-                        "intent": metadata.get("intent", "unknown"),
-                        "query_result": json.loads(metadata.get("query_result", "{}")),
-                        "relevance": 1.0 - (results['distances'][0][i] if results['distances'] else 1.0)
-                    })
+            if not results or not results['metadatas']:
+                return []
             
-            return context_items
+            return [
+                self._format_context(
+                    metadata or {}, self._similarity(self.context_collection, distance)
+                )
+                for metadata, distance in zip(results['metadatas'][0], results['distances'][0])
+            ]
             
         except Exception as e:
             logger.error(f"Failed to get conversation context: {e}")
             return []
     
+    @staticmethod
+    def _format_context(metadata: Dict[str, Any], relevance: float) -> Dict[str, Any]:
+        """Build a conversation context item from its stored metadata."""
+        return {
+            "user_message": metadata.get("user_message", ""),
+            "agent_response": metadata.get("agent_response", ""),
+            "intent": metadata.get("intent", "unknown"),
+            "query_result": _load_payload(metadata, {"query_result": {}})["query_result"],
+            "relevance": relevance
+        }
+    
+    def _rank_session_context(
+        self,
+        session: _SessionContext,
+        query_embedding: np.ndarray,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """Rank a cached session's context against the query in one matrix-vector product."""
+        if not session.ids or limit <= 0:
+            return []
+        
+        # Embeddings are unit length, so the inner product is the cosine
+        similarities = session.embeddings @ query_embedding
+        
+        if limit < len(similarities):
+            top = np.argpartition(-similarities, limit)[:limit]
+            top = top[np.argsort(-similarities[top])]
+        else:
+            top = np.argsort(-similarities)
+        
+        return [
+            self._format_context(session.documents[i], float(similarities[i]))
+            for i in top
+        ]
+    
+    def _cache_session(self, session_id: str, session: _SessionContext) -> None:
+        """Keep a session's context in memory, evicting the least recently used."""
+        if len(session.ids) > SESSION_CACHE_MAX_ENTRIES:
+            # Only remember that the session is ranked by Chroma
+            session = None
+        
+        self._session_cache[session_id] = session
+        self._session_cache.move_to_end(session_id)
+        while len(self._session_cache) > SESSION_CACHE_SIZE:
+            self._session_cache.popitem(last=False)
+    
+    def _remember_session_context(
+        self,
+        session_id: str,
+        context_id: str,
+        embedding: np.ndarray,
+        document: Dict[str, Any]
+    ) -> None:
+        """Mirror a stored context entry into the in-memory session cache.
+
+        Sessions that are not cached are left alone: their history is loaded
+        from Chroma in full on the next lookup.
+        """
+        loading = self._session_loads.get(session_id)
+        if loading is not None:
+            loading.append((context_id, embedding, document))
+        
+        session = self._session_cache.get(session_id)
+        if session is not None:
+            session.upsert(context_id, embedding, document)
+            self._cache_session(session_id, session)
+    
+    async def _load_session_context(self, session_id: str) -> Optional[_SessionContext]:
+        """Load a session's stored context from Chroma into the session cache.
+
+        Returns None if the session is too large to rank in memory.
+        """
+        # Entries still waiting in the write buffer are not in Chroma yet
+        buffered = [
+            item for item in self._write_buffers.get(self.context_collection.name, [])
+            if item[2].get("session_id") == session_id
+        ]
+        loading = self._session_loads.setdefault(session_id, [])
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._io_pool,
+                partial(
+                    self.context_collection.get,
+                    where={"session_id": session_id},
+                    include=["embeddings", "metadatas"]
+                )
+            )
+        finally:
+            self._session_loads.pop(session_id, None)
+        
+        session = _SessionContext()
+        ids = results.get("ids") or []
+        if ids:
+            session.ids = list(ids)
+            session.documents = list(results["metadatas"])
+            session.embeddings = np.array(results["embeddings"], dtype=np.float32)
+        for item_id, embedding, document in buffered + loading:
+            session.upsert(item_id, embedding, document)
+        
+        self._cache_session(session_id, session)
+        return self._session_cache[session_id]
+    
+    async def get_session_contexts(
+        self,
+        session_ids: List[str],
+        limit: int = 10
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get stored conversation context for several sessions in one lookup.
+
+        Unlike ``get_conversation_context`` this does no similarity ranking:
+        it is a metadata filter over the sessions, so nothing is embedded.
+        Each session gets its newest ``limit`` entries, most recent first.
+        Sessions held in the session cache are served from memory.
+        """
+        contexts: Dict[str, List[Dict[str, Any]]] = {session_id: [] for session_id in session_ids}
+        if not self.client or not session_ids:
+            return contexts
+        
+        try:
+            entries: Dict[str, List[Dict[str, Any]]] = {session_id: [] for session_id in session_ids}
+            uncached = []
+            for session_id in entries:
+                session = self._session_cache.get(session_id)
+                if session is not None:
+                    entries[session_id].extend(session.documents)
+                else:
+                    uncached.append(session_id)
+            
+            if uncached:
+                where = (
+                    {"session_id": uncached[0]}
+                    if len(uncached) == 1
+                    else {"session_id": {"$in": uncached}}
+                )
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._io_pool,
+                    partial(self.context_collection.get, where=where, include=["metadatas"])
+                )
+                for metadata in (results or {}).get("metadatas") or []:
+                    items = entries.get(metadata.get("session_id"))
+                    if items is not None:
+                        items.append(metadata)
+            
+            # Entries stored before timestamps were recorded count as oldest;
+            # only the kept entries have their payload decoded
+            for session_id, items in entries.items():
+                newest = heapq.nlargest(limit, items, key=lambda metadata: metadata.get("timestamp", 0.0))
+                contexts[session_id] = [
+                    {
+                        "user_message": metadata.get("user_message", ""),
+                        "agent_response": metadata.get("agent_response", ""),
+                        "intent": metadata.get("intent", "unknown"),
+                        "query_result": _load_payload(metadata, {"query_result": {}})["query_result"]
+                    }
+                    for metadata in newest
+                ]
+        except Exception as e:
+            logger.error(f"Failed to get session contexts: {e}")
+        
+        return contexts
+    
     async def store_schema_information(
         self,
         index_name: str,
@@ -325,32 +894,23 @@ class VectorDBService:
             description_text = f"Index: {index_name}\nFields: {', '.join(field_descriptions)}"
             
             # Generate embedding
-            embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, description_text
-            )
+            embedding = await self._embed(description_text)
             
-            if not embedding:
+            if embedding is None:
                 return None
             
             # Prepare document
             document = {
                 "index_name": index_name,
-                "schema": json.dumps(schema),
-                "sample_data": json.dumps(sample_data or []),
                 "description": description_text,
-                "field_count": len(field_descriptions)
+                "field_count": len(field_descriptions),
+                "payload": dumps({"schema": schema, "sample_data": sample_data or []})
             }
             
-            # Store in ChromaDB
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.schema_collection.upsert,
-                [schema_id],
-                [embedding],
-                [document]
-            )
+            # Store in ChromaDB with the next batched write
+            await self._queue_upsert(self.schema_collection, schema_id, embedding, document)
             
-            logger.info(f"Stored schema information for index: {index_name}")
+            logger.debug(f"Stored schema information for index: {index_name}")
             return schema_id
             
         except Exception as e:
@@ -367,37 +927,33 @@ class VectorDBService:
             if not self.client or not self.embedding_model:
                 return []
             
+            cache_namespace = f"schemas:{limit}"
+            cached = await self._get_cached_search(cache_namespace, query_description)
+            if cached is not None:
+                return cached
+            
             # Generate embedding for query description
-            query_embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self._generate_embedding, query_description
-            )
+            query_embedding = await self._embed(query_description)
             
-            if not query_embedding:
+            if query_embedding is None:
                 return []
             
             # Search for relevant schemas
-            results = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.schema_collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=limit
-                )
-            )
+            results = await self._search_collection(self.schema_collection, query_embedding, limit)
             
             schemas = []
             
-            if results and results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    
-                    schemas.append({
-                        "index_name": metadata.get("index_name", ""),
-                        "schema": json.loads(metadata.get("schema", "{}")),
-                        "sample_data": json.loads(metadata.get("sample_data", "[]")),
-                        "description": metadata.get("description", ""),
-                        "relevance": 1.0 - (results['distances'][0][i] if results['distances'] else 1.0)
-                    })
-            
+            for _, metadata, relevance in results:
+                payload = _load_payload(metadata, {"schema": {}, "sample_data": []})
+                schemas.append({
+                    "index_name": metadata.get("index_name", ""),
+                    "schema": payload["schema"],
+                    "sample_data": payload["sample_data"],
+                    "description": metadata.get("description", ""),
+                    "relevance": relevance
+                })
+            
+            await self._cache_search(cache_namespace, query_description, schemas)
             return schemas
             
         except Exception as e:
@@ -405,29 +961,36 @@ class VectorDBService:
             return []
     
     async def get_collection_stats(self) -> Dict[str, Any]:
-        """Get statistics about stored data."""
+        """Get statistics about stored data, served from a short-lived cache."""
         try:
             if not self.client:
                 return {}
             
-            stats = {}
-            
-            # Get collection counts
-            for collection_name, collection in [
-                ("query_examples", self.query_collection),
-                ("conversation_context", self.context_collection),
-                ("data_schemas", self.schema_collection)
-            ]:
-                try:
-                    count = await asyncio.get_event_loop().run_in_executor(
-                        None, collection.count
-                    )
-                    stats[collection_name] = count
-                except Exception as e:
-                    logger.error(f"Failed to get count for {collection_name}: {e}")
-                    stats[collection_name] = 0
-            
-            return stats
+            async with self._stats_lock:
+                if self._stats_cache is not None:
+                    fetched_at, stats = self._stats_cache
+                    if time.monotonic() - fetched_at < STATS_CACHE_TTL:
+                        return dict(stats)
+                
+                stats = {}
+                
+                # Get collection counts
+                for collection_name, collection in [
+                    ("query_examples", self.query_collection),
+                    ("conversation_context", self.context_collection),
+                    ("data_schemas", self.schema_collection)
+                ]:
+                    try:
+                        count = await asyncio.get_running_loop().run_in_executor(
+                            self._io_pool, collection.count
+                        )
+                        stats[collection_name] = count
+                    except Exception as e:
+                        logger.error(f"Failed to get count for {collection_name}: {e}")
+                        stats[collection_name] = 0
+                
+                self._stats_cache = (time.monotonic(), stats)
+                return dict(stats)
             
         except Exception as e:
             logger.error(f"Failed to get collection stats: {e}")
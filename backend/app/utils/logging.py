@@ -1,27 +1,61 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from typing import Optional
 
+# Background thread that writes queued records to the real handlers
+_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def setup_logging(level: Optional[str] = None) -> None:
-    """Setup basic logging configuration for MVP."""
+    """Setup basic logging configuration for MVP.
+
+    Log calls only enqueue the record; a listener thread writes it to stdout
+    and ``app.log``, so request handlers never block on file I/O.
+    """
+    global _listener
     log_level = level or "INFO"
-    
+
     # Configure logging format
     log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    
-    # Configure logging
+
+    stop_logging()
+    log_queue: queue.Queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("app.log"),
+        respect_handler_level=True
+    )
+    _listener.start()
+
+    # Configure logging; the queue handler formats records before they are
+    # handed to the listener thread
     logging.basicConfig(
         level=getattr(logging, log_level.upper()),
         format=log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler("app.log")
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+        force=True
     )
-    
+
     # Set specific loggers
     logging.getLogger("elasticsearch").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("redis").setLevel(logging.WARNING)
-    logging.getLogger("uvicorn.access").setLevel(logging.WARNING) 
\ No newline at end of file
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+
+def stop_logging() -> None:
+    """Write out queued log records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+# Flush any queued records at interpreter exit
+atexit.register(stop_logging)
@@ -1,19 +1,31 @@
 import asyncio
 import json
 from datetime import datetime, timedelta
-import random
-from typing import List, Dict, Any
-from app.services.elasticsearch import ElasticsearchService
+from typing import List, Dict, Any, Iterable, Optional
+import numpy as np
+from elasticsearch.helpers import async_streaming_bulk
+from app.services.elasticsearch import get_shared_elasticsearch_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Documents per bulk request, and an upper bound on a request's body size
+BULK_CHUNK_SIZE = 500
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+
+def _isoformat(base: datetime, offsets: np.ndarray) -> List[str]:
+    """Format ``base + offset`` for every offset like ``datetime.isoformat``."""
+    timestamps = np.datetime64(base, "us") + offsets
+    return np.datetime_as_string(timestamps, unit="us").tolist()
+
 
 class SampleDataGenerator:
     """Generate sample data for testing the Elasticsearch Agent."""
     
-    def __init__(self, es_service=None):
-        self.es_service = es_service or ElasticsearchService()
+    def __init__(self, es_service=None, seed: Optional[int] = None):
+        self.es_service = es_service or get_shared_elasticsearch_service()
+        self.rng = np.random.default_rng(seed)
         self.products = [
             "Laptop", "Smartphone", "Tablet", "Headphones", "Smart Watch",
             "Camera", "Keyboard", "Mouse", "Monitor", "Speaker"
@@ -30,74 +42,101 @@ class SampleDataGenerator:
     
     def generate_sales_data(self, num_records: int = 100) -> List[Dict[str, Any]]:
         """Generate sample sales data."""
-        data = []
+        rng = self.rng
         base_date = datetime.now() - timedelta(days=90)
         
-        for i in range(num_records):
-            record = {
-                "@timestamp": (base_date + timedelta(
-                    days=random.randint(0, 90),
-                    hours=random.randint(0, 23),
-                    minutes=random.randint(0, 59)
-                )).isoformat(),
+        # Draw every field for all records at once; tolist() hands back
+        # plain Python values for the documents
+        minute_offsets = (
+            rng.integers(0, 91, num_records) * 1440
+            + rng.integers(0, 24, num_records) * 60
+            + rng.integers(0, 60, num_records)
+        )
+        timestamps = _isoformat(base_date, minute_offsets.astype("timedelta64[m]"))
+        products = rng.choice(self.products, num_records).tolist()
+        categories = rng.choice(self.categories, num_records).tolist()
+        customers = rng.choice(self.customers, num_records).tolist()
+        regions = rng.choice(self.regions, num_records).tolist()
+        quantity = rng.integers(1, 6, num_records)
+        unit_price = np.round(rng.uniform(50, 1000, num_records), 2)
+        discount = np.round(rng.uniform(0, 0.2, num_records), 2)
+        total_amount = np.round(quantity * unit_price * (1 - discount), 2)
+        statuses = rng.choice(["completed", "pending", "cancelled"], num_records).tolist()
+        payment_methods = rng.choice(["credit_card", "paypal", "bank_transfer"], num_records).tolist()
+        cities = rng.choice(["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"], num_records).tolist()
+        states = rng.choice(["NY", "CA", "IL", "TX", "AZ"], num_records).tolist()
+        zipcodes = rng.integers(10000, 100000, num_records).astype(str).tolist()
+        
+        return [
+            {
+                "@timestamp": timestamp,
                 "order_id": f"ORD-{1000 + i}",
-                "product_name": random.choice(self.products),
-                "category": random.choice(self.categories),
-                "customer_name": random.choice(self.customers),
-                "region": random.choice(self.regions),
-                "quantity": random.randint(1, 5),
-                "unit_price": round(random.uniform(50, 1000), 2),
-                "total_amount": 0,  # Will calculate below
-                "discount": round(random.uniform(0, 0.2), 2),
-                "status": random.choice(["completed", "pending", "cancelled"]),
-                "payment_method": random.choice(["credit_card", "paypal", "bank_transfer"]),
+                "product_name": product,
+                "category": category,
+                "customer_name": customer,
+                "region": region,
+                "quantity": qty,
+                "unit_price": price,
+                "total_amount": total,
+                "discount": disc,
+                "status": status,
+                "payment_method": payment_method,
                 "shipping_address": {
-                    "city": random.choice(["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"]),
-                    "state": random.choice(["NY", "CA", "IL", "TX", "AZ"]),
-                    "zipcode": f"{random.randint(10000, 99999)}"
+                    "city": city,
+                    "state": state,
+                    "zipcode": zipcode
                 }
             }
-            
-            # Calculate total amount
-            subtotal = record["quantity"] * record["unit_price"]
-            record["total_amount"] = round(subtotal * (1 - record["discount"]), 2)
-            
-            data.append(record)
-        
-        return data
+            for i, (
+                timestamp, product, category, customer, region, qty, price, total, disc,
+                status, payment_method, city, state, zipcode
+            ) in enumerate(zip(
+                timestamps, products, categories, customers, regions,
+                quantity.tolist(), unit_price.tolist(), total_amount.tolist(), discount.tolist(),
+                statuses, payment_methods, cities, states, zipcodes
+            ))
+        ]
     
     def generate_logs_data(self, num_records: int = 200) -> List[Dict[str, Any]]:
         """Generate sample application logs."""
-        data = []
+        rng = self.rng
         base_date = datetime.now() - timedelta(days=7)
         
         log_levels = ["INFO", "WARN", "ERROR", "DEBUG"]
         services = ["api-gateway", "user-service", "payment-service", "inventory-service"]
         
-        for i in range(num_records):
-            level = random.choice(log_levels)
-            service = random.choice(services)
-            
-            record = {
-                "@timestamp": (base_date + timedelta(
-                    hours=random.randint(0, 168),  # 7 days
-                    minutes=random.randint(0, 59),
-                    seconds=random.randint(0, 59)
-                )).isoformat(),
+        second_offsets = (
+            rng.integers(0, 169, num_records) * 3600  # 7 days
+            + rng.integers(0, 60, num_records) * 60
+            + rng.integers(0, 60, num_records)
+        )
+        timestamps = _isoformat(base_date, second_offsets.astype("timedelta64[s]"))
+        levels = rng.choice(log_levels, num_records).tolist()
+        record_services = rng.choice(services, num_records).tolist()
+        request_ids = rng.integers(100000, 1000000, num_records).tolist()
+        user_ids = rng.integers(1, 101, num_records).tolist()
+        response_times = rng.integers(10, 5001, num_records).tolist()
+        status_codes = rng.choice([200, 201, 400, 401, 404, 500], num_records).tolist()
+        octets = rng.integers(1, 256, (num_records, 4)).tolist()
+        
+        return [
+            {
+                "@timestamp": timestamp,
                 "level": level,
                 "service": service,
                 "message": f"Sample {level.lower()} message from {service}",
-                "request_id": f"req-{random.randint(100000, 999999)}",
-                "user_id": f"user-{random.randint(1, 100)}",
-                "response_time_ms": random.randint(10, 5000),
-                "status_code": random.choice([200, 201, 400, 401, 404, 500]),
-                "ip_address": f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}",
+                "request_id": f"req-{request_id}",
+                "user_id": f"user-{user_id}",
+                "response_time_ms": response_time,
+                "status_code": status_code,
+                "ip_address": f"{a}.{b}.{c}.{d}",
                 "user_agent": "Mozilla/5.0 (compatible; TestAgent/1.0)"
             }
-            
-            data.append(record)
-        
-        return data
+            for timestamp, level, service, request_id, user_id, response_time, status_code, (a, b, c, d) in zip(
+                timestamps, levels, record_services, request_ids, user_ids,
+                response_times, status_codes, octets
+            )
+        ]
     
     async def create_index_with_mapping(self, index_name: str, mapping: Dict[str, Any]):
         """Create index with proper mapping."""
@@ -110,8 +149,8 @@ class SampleDataGenerator:
                 return
             
             # Create index with mapping
-            await self.es_service.client.indices.create(
-                index=index_name,
+            await self.es_service.create_index(
+                index_name,
                 body={
                     "mappings": mapping,
                     "settings": {
@@ -127,26 +166,37 @@ class SampleDataGenerator:
             logger.error(f"Failed to create index '{index_name}': {e}")
             raise
     
-    async def bulk_insert_data(self, index_name: str, data: List[Dict[str, Any]]):
-        """Bulk insert data into Elasticsearch."""
+    async def bulk_insert_data(self, index_name: str, data: Iterable[Dict[str, Any]]):
+        """Bulk insert data into Elasticsearch.
+        
+        Documents are streamed to Elasticsearch in chunks, so ``data`` may be
+        a generator. The index is refreshed once, after the last chunk.
+        """
         try:
-            # Prepare bulk request
-            bulk_body = []
+            actions = ({"_index": index_name, "_source": doc} for doc in data)
+            indexed = 0
+            failed = 0
             
-            for doc in data:
-                bulk_body.append({"index": {"_index": index_name}})
-                bulk_body.append(doc)
+            async for ok, item in async_streaming_bulk(
+                self.es_service.client,
+                actions,
+                chunk_size=BULK_CHUNK_SIZE,
+                max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+                raise_on_error=False
+            ):
+                if ok:
+                    indexed += 1
+                else:
+                    failed += 1
             
-            # Execute bulk request
-            response = await self.es_service.client.bulk(
-                body=bulk_body,
-                refresh=True
-            )
+            await self.es_service.client.indices.refresh(index=index_name)
+            # Bulk writes may have auto-created the index
+            self.es_service.invalidate_indices_cache()
             
-            if response.get("errors"):
-                logger.warning(f"Some documents failed to index in '{index_name}'")
+            if failed:
+                logger.warning(f"{failed} documents failed to index in '{index_name}'")
             else:
-                logger.info(f"Successfully indexed {len(data)} documents in '{index_name}'")
+                logger.info(f"Successfully indexed {indexed} documents in '{index_name}'")
             
         except Exception as e:
             logger.error(f"Failed to bulk insert data into '{index_name}': {e}")
@@ -215,9 +265,9 @@ class SampleDataGenerator:
 
 
 # Utility function to run sample data setup
-async def setup_sample_data():
+async def setup_sample_data(es_service=None):
     """Main function to setup sample data."""
-    generator = SampleDataGenerator()
+    generator = SampleDataGenerator(es_service)
     await generator.setup_sample_indices()
 
 
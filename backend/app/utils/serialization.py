@@ -0,0 +1,91 @@
+"""JSON helpers backed by orjson when it is installed."""
+
+import json
+import re
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+# Structural tokens for the object scanner: a complete string literal (so its
+# contents, including braces and escapes, are skipped by the regex engine) or
+# a single brace
+_JSON_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(value: Any) -> Any:
+    """Fallback for values the JSON encoder does not handle natively."""
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def dumps(data: Any, indent: bool = False) -> str:
+    """Serialize data to a JSON string, optionally indented by two spaces.
+
+    numpy values are converted to Python numbers and anything else without a
+    JSON representation (e.g. Decimal) is rendered with ``str``, so prompt
+    building never fails on unusual document values.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option).decode()
+    return json.dumps(data, indent=2 if indent else None, default=_default)
+
+
+def dumpb(data: Any) -> bytes:
+    """Serialize data to compact UTF-8 JSON bytes, e.g. for a network payload."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(data, default=_default, option=option)
+    return json.dumps(data, default=_default).encode()
+
+
+def _find_object_end(text: str, start: int) -> Optional[int]:
+    """Return the index just past the object opening at ``start``, if balanced."""
+    depth = 0
+    for match in _JSON_TOKEN_RE.finditer(text, start):
+        char = match.group()
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return match.end()
+
+    return None
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    """Extract the first parseable JSON object embedded in free-form text.
+
+    Markdown code fences and surrounding prose contain no structural
+    characters outside of strings, so a single left-to-right scan from the
+    first brace skips them without a separate stripping pass.
+    """
+    start = text.find("{")
+    while start != -1:
+        end = _find_object_end(text, start)
+        if end is None:
+            break
+        try:
+            result = loads(text[start:end])
+        except ValueError:
+            result = None
+        if isinstance(result, dict):
+            return result
+        start = text.find("{", start + 1)
+
+    return None
@@ -7,7 +7,7 @@ from app.core.dependencies import initialize_services, cleanup_services
 from app.core.middleware import LoggingMiddleware, ExceptionHandlerMiddleware
 from app.api.routes import router
 from app.api.websocket import handle_websocket_chat
-from app.utils.logging import setup_logging
+from app.utils.logging import setup_logging, stop_logging
 
 
 @asynccontextmanager
@@ -15,10 +15,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
     setup_logging(settings.log_level)
-    initialize_services()
+    await initialize_services()
     yield
     # Shutdown
     await cleanup_services()
+    stop_logging()
 
 
 def create_app() -> FastAPI:
@@ -61,9 +62,12 @@ app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
+    # uvicorn picks up uvloop and httptools from the speedups extra when
+    # they are installed
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        ws="websockets"
     )
@@ -1,24 +1,54 @@
 """
 Sample data ingestion script for Elasticsearch
 """
+import argparse
 import asyncio
-import random
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Awaitable, Iterable
 import sys
 import os
 
 # Add parent directory to path to import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.elasticsearch import ElasticsearchService
+import numpy as np
+from elasticsearch import BadRequestError
+from elasticsearch.helpers import async_streaming_bulk
+from app.services.elasticsearch import (
+    ElasticsearchService,
+    close_shared_elasticsearch_service,
+    get_shared_elasticsearch_service
+)
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Documents per bulk request, and an upper bound on a request's body size
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_CHUNK_BYTES = 5 * 1024 * 1024
 
-def generate_sample_sales_data() -> List[Dict[str, Any]]:
+
+def _timestamps(base: datetime, offsets: np.ndarray) -> List[datetime]:
+    """Return ``base + offset`` for every offset as ``datetime`` objects.
+
+    The client serializer writes them out as ISO strings.
+    """
+    return (np.datetime64(base, "us") + offsets).astype("datetime64[us]").tolist()
+
+
+def _pick(rng: np.random.Generator, values: List[Any], size: int) -> List[Any]:
+    """Draw ``size`` random elements of ``values``.
+    
+    Strings are interned and every pick references the pool object, so a
+    category repeated across thousands of records is stored once.
+    """
+    pool = np.array([sys.intern(v) if isinstance(v, str) else v for v in values], dtype=object)
+    return rng.choice(pool, size).tolist()
+
+
+def generate_sample_sales_data(num_records: int = 1000) -> List[Dict[str, Any]]:
     """Generate sample sales data for testing."""
     products = [
         "iPhone 15", "Samsung Galaxy S24", "MacBook Pro", "Dell XPS",
@@ -32,131 +62,201 @@ def generate_sample_sales_data() -> List[Dict[str, Any]]:
         "David Brown", "Lisa Garcia", "Tom Anderson", "Emma Taylor"
     ]
     
-    data = []
+    rng = np.random.default_rng()
     start_date = datetime.now() - timedelta(days=90)
     
-    for i in range(1000):  # Generate 1000 sample records
-        sale_date = start_date + timedelta(
-            days=random.randint(0, 90),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59)
-        )
-        
-        record = {
+    # Draw every column at once, then assemble the records
+    minute_offsets = (
+        rng.integers(0, 91, num_records) * 1440
+        + rng.integers(0, 24, num_records) * 60
+        + rng.integers(0, 60, num_records)
+    )
+    dates = _timestamps(start_date, minute_offsets.astype("timedelta64[m]"))
+    columns = zip(
+        dates,
+        _pick(rng, products, num_records),
+        _pick(rng, regions, num_records),
+        _pick(rng, sales_people, num_records),
+        np.round(rng.uniform(100, 2000, num_records), 2).tolist(),
+        rng.integers(1, 11, num_records).tolist(),
+        _pick(rng, ["completed", "pending", "cancelled"], num_records),
+        _pick(rng, ["individual", "business"], num_records),
+        _pick(rng, ["credit_card", "cash", "bank_transfer"], num_records),
+        np.round(rng.uniform(0, 20, num_records), 1).tolist()  # Discount percentage
+    )
+    
+    return [
+        {
             "id": f"sale_{i+1:04d}",
-            "product": random.choice(products),
-            "region": random.choice(regions),
-            "salesperson": random.choice(sales_people),
-            "amount": round(random.uniform(100, 2000), 2),
-            "quantity": random.randint(1, 10),
-            "date": sale_date.isoformat(),
-            "status": random.choice(["completed", "pending", "cancelled"]),
-            "customer_type": random.choice(["individual", "business"]),
-            "payment_method": random.choice(["credit_card", "cash", "bank_transfer"]),
-            "discount": round(random.uniform(0, 20), 1),  # Discount percentage
-            "created_at": sale_date.isoformat()
+            "product": product,
+            "region": region,
+            "salesperson": salesperson,
+            "amount": amount,
+            "quantity": quantity,
+            "date": date,
+            "status": status,
+            "customer_type": customer_type,
+            "payment_method": payment_method,
+            "discount": discount,
+            "created_at": date
         }
-        data.append(record)
-    
-    return data
+        for i, (
+            date, product, region, salesperson, amount, quantity,
+            status, customer_type, payment_method, discount
+        ) in enumerate(columns)
+    ]
 
 
-def generate_sample_logs_data() -> List[Dict[str, Any]]:
+def generate_sample_logs_data(num_records: int = 5000) -> List[Dict[str, Any]]:
     """Generate sample log data for testing."""
     log_levels = ["INFO", "DEBUG", "WARN", "ERROR"]
     services = ["api-gateway", "user-service", "payment-service", "inventory-service"]
     
-    data = []
+    rng = np.random.default_rng()
     start_date = datetime.now() - timedelta(days=30)
     
-    for i in range(5000):  # Generate 5000 log records
-        log_date = start_date + timedelta(
-            days=random.randint(0, 30),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59)
-        )
-        
-        record = {
+    second_offsets = (
+        rng.integers(0, 31, num_records) * 86400
+        + rng.integers(0, 24, num_records) * 3600
+        + rng.integers(0, 60, num_records) * 60
+        + rng.integers(0, 60, num_records)
+    )
+    timestamps = _timestamps(start_date, second_offsets.astype("timedelta64[s]"))
+    octets = rng.integers(1, 256, (num_records, 2)).tolist()
+    columns = zip(
+        timestamps,
+        _pick(rng, log_levels, num_records),
+        _pick(rng, services, num_records),
+        rng.integers(1, 1001, num_records).tolist(),
+        rng.integers(1, 10001, num_records).tolist(),
+        rng.integers(10, 5001, num_records).tolist(),
+        _pick(rng, [200, 201, 400, 401, 404, 500], num_records),
+        octets
+    )
+    
+    return [
+        {
             "id": f"log_{i+1:06d}",
-            "timestamp": log_date.isoformat(),
-            "level": random.choice(log_levels),
-            "service": random.choice(services),
+            "timestamp": timestamp,
+            "level": level,
+            "service": service,
             "message": f"Log message {i+1}",
-            "user_id": f"user_{random.randint(1, 1000):04d}",
-            "request_id": f"req_{random.randint(1, 10000):06d}",
-            "duration_ms": random.randint(10, 5000),
-            "status_code": random.choice([200, 201, 400, 401, 404, 500]),
-            "ip_address": f"192.168.{random.randint(1, 255)}.{random.randint(1, 255)}",
-            "created_at": log_date.isoformat()
+            "user_id": f"user_{user:04d}",
+            "request_id": f"req_{request:06d}",
+            "duration_ms": duration,
+            "status_code": status_code,
+            "ip_address": f"192.168.{c}.{d}",
+            "created_at": timestamp
         }
-        data.append(record)
-    
-    return data
+        for i, (
+            timestamp, level, service, user, request, duration, status_code, (c, d)
+        ) in enumerate(columns)
+    ]
 
 
-async def create_index_with_mapping(index_name: str, mapping: Dict[str, Any]):
-    """Create index with proper mapping."""
+async def create_index_with_mapping(es_service: ElasticsearchService, index_name: str, mapping: Dict[str, Any], force: bool = False) -> bool:
+    """Create index with proper mapping.
+    
+    An existing index is kept unless ``force`` is set, in which case it is
+    deleted and recreated. Returns whether the index was created.
+    """
     try:
-        # Delete index if exists
-        try:
-            await es_service.client.indices.delete(index=index_name)
-            logger.info(f"Deleted existing index: {index_name}")
-        except Exception:
-            pass
+        if force:
+            await es_service.delete_index(index_name, ignore_unavailable=True)
+            logger.info(f"Removed any existing index: {index_name}")
         
         # Create index with mapping
-        await es_service.client.indices.create(
-            index=index_name,
-            body={
-                "mappings": mapping,
-                "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0
+        try:
+            await es_service.create_index(
+                index_name,
+                body={
+                    "mappings": mapping,
+                    "settings": {
+                        "number_of_shards": 1,
+                        "number_of_replicas": 0
+                    }
                 }
-            }
-        )
+            )
+        except BadRequestError as e:
+            if e.error != "resource_already_exists_exception":
+                raise
+            logger.info(f"Index {index_name} already exists, skipping (use --force to recreate)")
+            return False
+        
         logger.info(f"Created index: {index_name}")
+        return True
         
     except Exception as e:
         logger.error(f"Error creating index {index_name}: {e}")
         raise
 
 
-async def ingest_bulk_data(index_name: str, documents: List[Dict[str, Any]]):
-    """Ingest documents in bulk."""
+async def ingest_bulk_data(es_service: ElasticsearchService, index_name: str, documents: Iterable[Dict[str, Any]]) -> int:
+    """Ingest documents in bulk, streamed in chunks.
+    
+    Returns the number of documents indexed.
+    """
     try:
-        # Prepare bulk body
-        bulk_body = []
-        for doc in documents:
-            bulk_body.append({"index": {"_index": index_name}})
-            bulk_body.append(doc)
-        
-        # Execute bulk insert
-        response = await es_service.client.bulk(
-            body=bulk_body,
-            refresh=True  # Make documents immediately available for search
+        # Every document shares the same action line, so serialize it once
+        # instead of building and encoding an action dict per document
+        action_line = es_service.client.transport.serializers.dumps(
+            {"index": {"_index": index_name}}, mimetype="application/json"
         )
+        indexed = 0
+        failed = 0
         
-        if response["errors"]:
-            logger.error(f"Bulk insert had errors: {response}")
+        # Chunks are sent as the generator is consumed; 429 rejections are retried
+        async for ok, item in async_streaming_bulk(
+            es_service.client,
+            documents,
+            expand_action_callback=lambda doc: (action_line, doc),
+            chunk_size=BULK_CHUNK_SIZE,
+            max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+            max_retries=3,
+            initial_backoff=1,
+            raise_on_error=False
+        ):
+            if ok:
+                indexed += 1
+            else:
+                failed += 1
+                logger.error(f"Bulk insert error: {item}")
+        
+        # Make documents available for search with a single refresh
+        await es_service.client.indices.refresh(index=index_name)
+        # Bulk writes may have auto-created the index
+        es_service.invalidate_indices_cache()
+        
+        if failed:
+            logger.error(f"Bulk insert into {index_name} had {failed} errors")
         else:
-            logger.info(f"Successfully inserted {len(documents)} documents into {index_name}")
+            logger.info(f"Successfully inserted {indexed} documents into {index_name}")
             
-        return response
+        return indexed
         
     except Exception as e:
         logger.error(f"Error during bulk insert: {e}")
         raise
 
 
-async def setup_sample_data(es_service=None):
+async def _ingest_index(es_service: ElasticsearchService, index_name: str, mapping: Dict[str, Any], documents: Awaitable[List[Dict[str, Any]]], force: bool = False) -> int:
+    """Create an index and bulk load its documents.
+    
+    ``documents`` is still being generated while the index is created. An
+    index that already exists is left as it is unless ``force`` is set.
+    """
+    if not await create_index_with_mapping(es_service, index_name, mapping, force):
+        return 0
+    return await ingest_bulk_data(es_service, index_name, await documents)
+
+
+async def setup_sample_data(es_service=None, force: bool = False):
     """Setup all sample data."""
     logger.info("Starting sample data setup...")
     
-    # Initialize service if not provided
+    # Use the shared service if none was provided
     if es_service is None:
-        es_service = ElasticsearchService()
+        es_service = get_shared_elasticsearch_service()
     
     # Check ES connection
     if not await es_service.ping():
@@ -199,21 +299,27 @@ async def setup_sample_data(es_service=None):
     }
     
     try:
-        # Create sales index and ingest data
-        await create_index_with_mapping("sales", sales_mapping)
-        sales_data = generate_sample_sales_data()
-        await ingest_bulk_data("sales", sales_data)
-        
-        # Create logs index and ingest data
-        await create_index_with_mapping("logs", logs_mapping)
-        logs_data = generate_sample_logs_data()
-        await ingest_bulk_data("logs", logs_data)
+        # The indices are independent, so load both concurrently; the data is
+        # generated in worker processes while the indices are being created
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            sales_future = loop.run_in_executor(pool, generate_sample_sales_data)
+            logs_future = loop.run_in_executor(pool, generate_sample_logs_data)
+            sales_task = asyncio.create_task(
+                _ingest_index(es_service, "sales", sales_mapping, sales_future, force)
+            )
+            logs_task = asyncio.create_task(
+                _ingest_index(es_service, "logs", logs_mapping, logs_future, force)
+            )
+            await asyncio.gather(sales_task, logs_task)
         
         logger.info("Sample data setup completed successfully!")
         
         # Print summary
-        sales_count = await es_service.client.count(index="sales")
-        logs_count = await es_service.client.count(index="logs")
+        sales_count, logs_count = await asyncio.gather(
+            es_service.client.count(index="sales"),
+            es_service.client.count(index="logs")
+        )
         
         logger.info(f"Sales documents: {sales_count['count']}")
         logger.info(f"Logs documents: {logs_count['count']}")
@@ -225,9 +331,12 @@ async def setup_sample_data(es_service=None):
         return False
 
 
-async def main():
+async def main(force: bool = False):
     """Main function."""
-    success = await setup_sample_data()
+    try:
+        success = await setup_sample_data(force=force)
+    finally:
+        await close_shared_elasticsearch_service()
     if success:
         logger.info("✅ Sample data ingestion completed successfully!")
     else:
@@ -236,4 +345,11 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="delete and recreate the sample indices if they already exist"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(force=args.force))
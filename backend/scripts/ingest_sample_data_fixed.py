@@ -1,86 +1,122 @@
 #!/usr/bin/env python3
 """Fixed sample data ingestion script."""
 
+import argparse
 import asyncio
 import sys
 import os
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable
 
 # Add the parent directory to the path so we can import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.elasticsearch import ElasticsearchService
+from elasticsearch import BadRequestError
+from elasticsearch.helpers import async_streaming_bulk
+from app.services.elasticsearch import (
+    ElasticsearchService,
+    close_shared_elasticsearch_service,
+    get_shared_elasticsearch_service
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Documents per bulk request, and an upper bound on a request's body size
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_CHUNK_BYTES = 5 * 1024 * 1024
 
-async def create_index_with_mapping(es_service: ElasticsearchService, index_name: str, mapping: Dict[str, Any]):
-    """Create index with proper mapping."""
+
+async def create_index_with_mapping(es_service: ElasticsearchService, index_name: str, mapping: Dict[str, Any], force: bool = False) -> bool:
+    """Create index with proper mapping.
+    
+    An existing index is kept unless ``force`` is set, in which case it is
+    deleted and recreated. Returns whether the index was created.
+    """
     try:
-        # Delete index if exists
-        try:
-            await es_service.client.indices.delete(index=index_name)
-            logger.info(f"Deleted existing index: {index_name}")
-        except Exception:
-            pass
+        if force:
+            await es_service.delete_index(index_name, ignore_unavailable=True)
+            logger.info(f"Removed any existing index: {index_name}")
         
         # Create index with mapping
-        await es_service.client.indices.create(
-            index=index_name,
-            body={
-                "mappings": mapping,
-                "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0
+        try:
+            await es_service.create_index(
+                index_name,
+                body={
+                    "mappings": mapping,
+                    "settings": {
+                        "number_of_shards": 1,
+                        "number_of_replicas": 0
+                    }
                 }
-            }
-        )
+            )
+        except BadRequestError as e:
+            if e.error != "resource_already_exists_exception":
+                raise
+            logger.info(f"Index {index_name} already exists, skipping (use --force to recreate)")
+            return False
+        
         logger.info(f"Created index: {index_name}")
+        return True
         
     except Exception as e:
         logger.error(f"Error creating index {index_name}: {e}")
         raise
 
 
-async def bulk_index_data(es_service: ElasticsearchService, index_name: str, data: List[Dict[str, Any]]):
-    """Bulk index data to Elasticsearch."""
+async def bulk_index_data(es_service: ElasticsearchService, index_name: str, data: Iterable[Dict[str, Any]]):
+    """Bulk index data to Elasticsearch, streamed in chunks."""
     try:
-        # Prepare bulk data
-        bulk_data = []
-        for doc in data:
-            bulk_data.append({"index": {"_index": index_name}})
-            bulk_data.append(doc)
-        
-        # Bulk index
-        response = await es_service.client.bulk(
-            body=bulk_data,
-            refresh=True
+        # Every document shares the same action line, so serialize it once
+        # instead of building and encoding an action dict per document
+        action_line = es_service.client.transport.serializers.dumps(
+            {"index": {"_index": index_name}}, mimetype="application/json"
         )
-        
-        # Check for errors
-        if response.get("errors"):
-            logger.error(f"Bulk indexing errors for {index_name}")
-            for item in response["items"]:
-                if "error" in item.get("index", {}):
-                    logger.error(f"Error: {item['index']['error']}")
+        indexed = 0
+        failed = 0
+        
+        # Bulk index; chunks are sent as the generator is consumed
+        async for ok, item in async_streaming_bulk(
+            es_service.client,
+            data,
+            expand_action_callback=lambda doc: (action_line, doc),
+            chunk_size=BULK_CHUNK_SIZE,
+            max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+            max_retries=3,
+            initial_backoff=1,
+            raise_on_error=False
+        ):
+            if ok:
+                indexed += 1
+            else:
+                # Check for errors
+                failed += 1
+                logger.error(f"Error: {item.get('index', {}).get('error')}")
+        
+        # Refresh once, after the last chunk
+        await es_service.client.indices.refresh(index=index_name)
+        # Bulk writes may have auto-created the index
+        es_service.invalidate_indices_cache()
+        
+        if failed:
+            logger.error(f"Bulk indexing errors for {index_name}: {failed} documents failed")
         else:
-            logger.info(f"Successfully indexed {len(data)} documents to {index_name}")
+            logger.info(f"Successfully indexed {indexed} documents to {index_name}")
             
     except Exception as e:
         logger.error(f"Error bulk indexing to {index_name}: {e}")
         raise
 
 
-async def setup_sample_data():
+async def setup_sample_data(es_service=None, force: bool = False):
     """Setup all sample data."""
     logger.info("Starting sample data setup...")
     
-    # Initialize service
-    es_service = ElasticsearchService()
+    # Use the shared service if none was provided
+    if es_service is None:
+        es_service = get_shared_elasticsearch_service()
     
     try:
         # Check ES connection
@@ -117,8 +153,8 @@ async def setup_sample_data():
         }
         
         # Create indices
-        await create_index_with_mapping(es_service, "sales", sales_mapping)
-        await create_index_with_mapping(es_service, "logs", logs_mapping)
+        sales_created = await create_index_with_mapping(es_service, "sales", sales_mapping, force)
+        logs_created = await create_index_with_mapping(es_service, "logs", logs_mapping, force)
         
         # Generate sales data
         sales_data = []
@@ -129,6 +165,10 @@ async def setup_sample_data():
         
         base_date = datetime.now() - timedelta(days=90)
         
+        # Every field below cycles through a small set of values, so build
+        # each set once and index into it
+        sale_dates = [base_date + timedelta(days=d) for d in range(90)]
+        
         for i in range(500):
             sales_data.append({
                 "id": f"sale_{i+1:04d}",
@@ -137,7 +177,7 @@ async def setup_sample_data():
                 "salesperson": salespeople[i % len(salespeople)],
                 "amount": round(100 + (i * 10.5) % 1000, 2),
                 "quantity": (i % 10) + 1,
-                "date": (base_date + timedelta(days=i % 90)).isoformat(),
+                "date": sale_dates[i % 90],
                 "customer_type": customer_types[i % len(customer_types)]
             })
         
@@ -145,22 +185,28 @@ async def setup_sample_data():
         logs_data = []
         services = ["api", "web", "auth", "payment", "notification"]
         levels = ["INFO", "WARN", "ERROR", "DEBUG"]
+        status_codes = [200, 201, 400, 404, 500]
+        log_times = [base_date + timedelta(hours=h) for h in range(24*7)]
+        user_ids = [f"user_{u + 1:03d}" for u in range(100)]
+        octets = [str(o + 1) for o in range(255)]
         
         for i in range(1000):
             logs_data.append({
-                "timestamp": (base_date + timedelta(hours=i % (24*7))).isoformat(),
+                "timestamp": log_times[i % (24*7)],
                 "level": levels[i % len(levels)],
                 "message": f"Sample log message {i+1}",
                 "service": services[i % len(services)],
-                "user_id": f"user_{(i % 100) + 1:03d}",
-                "ip_address": f"192.168.{(i % 255) + 1}.{(i % 254) + 1}",
+                "user_id": user_ids[i % 100],
+                "ip_address": f"192.168.{octets[i % 255]}.{octets[i % 254]}",
                 "response_time": (i % 1000) + 50,
-                "status_code": [200, 201, 400, 404, 500][i % 5]
+                "status_code": status_codes[i % 5]
             })
         
-        # Index data
-        await bulk_index_data(es_service, "sales", sales_data)
-        await bulk_index_data(es_service, "logs", logs_data)
+        # Index data into the indices created by this run
+        if sales_created:
+            await bulk_index_data(es_service, "sales", sales_data)
+        if logs_created:
+            await bulk_index_data(es_service, "logs", logs_data)
         
         # Verify data
         sales_count = await es_service.client.count(index="sales")
@@ -174,15 +220,14 @@ async def setup_sample_data():
     except Exception as e:
         logger.error(f"Error setting up sample data: {e}")
         return False
-    
-    finally:
-        # Close service
-        await es_service.close()
 
 
-async def main():
+async def main(force: bool = False):
     """Main function."""
-    success = await setup_sample_data()
+    try:
+        success = await setup_sample_data(force=force)
+    finally:
+        await close_shared_elasticsearch_service()
     if success:
         logger.info("✅ Sample data ingestion completed successfully!")
     else:
@@ -191,4 +236,11 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="delete and recreate the sample indices if they already exist"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(force=args.force))
\ No newline at end of file
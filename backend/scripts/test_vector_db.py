@@ -56,6 +56,9 @@ async def test_vector_db():
             print("❌ Failed to store query example")
             return False
         
+        # Writes are batched; make them visible to the searches below
+        await vector_db.flush()
+        
         # Test finding similar queries
         print("\n🔍 Testing similar query search...")
         similar_queries = await vector_db.find_similar_queries(
@@ -83,6 +86,8 @@ async def test_vector_db():
         else:
             print("❌ Failed to store conversation context")
         
+        await vector_db.flush()
+        
         # Test getting conversation context
         print("\n📖 Testing conversation context retrieval...")
         context_items = await vector_db.get_conversation_context(
@@ -120,6 +125,8 @@ async def test_vector_db():
         else:
             print("❌ Failed to store schema information")
         
+        await vector_db.flush()
+        
         # Test getting relevant schemas
         print("\n🔎 Testing relevant schema retrieval...")
         relevant_schemas = await vector_db.get_relevant_schemas(
@@ -2,10 +2,12 @@
 
 import pytest
 import asyncio
+import httpx
 from unittest.mock import Mock, AsyncMock
 from app.core.config import Settings
 from app.core.exceptions import *
 from app.services.elasticsearch import ElasticsearchService
+import app.services.gemini as gemini_module
 from app.services.gemini import GeminiService
 from app.services.redis import RedisService
 from app.agents.elasticsearch_agent import ElasticsearchAgent
@@ -96,6 +98,30 @@ class TestEdgeCases:
         result = await service.simple_search("test_index", {"invalid": "query"})
         assert "error" in result
 
+    @pytest.mark.asyncio
+    async def test_elasticsearch_index_list_refreshed_after_changes(self):
+        """Test the cached index list is dropped when indices are created or deleted."""
+        service = ElasticsearchService()
+        service.client = Mock()
+        service.client.cat.indices = AsyncMock(side_effect=[
+            [{"index": "logs"}, {"index": ".kibana"}],
+            [{"index": "logs"}, {"index": "sales"}],
+            [{"index": "sales"}]
+        ])
+        service.client.indices.create = AsyncMock()
+        service.client.indices.delete = AsyncMock()
+
+        assert await service.list_indices() == ["logs"]
+        assert await service.list_indices() == ["logs"]
+        assert service.client.cat.indices.await_count == 1
+
+        await service.create_index("sales", body={"mappings": {}})
+        assert await service.list_indices() == ["logs", "sales"]
+
+        await service.delete_index("logs")
+        assert await service.list_indices() == ["sales"]
+        assert service.client.cat.indices.await_count == 3
+
     @pytest.mark.asyncio
     async def test_redis_operations_with_connection_loss(self):
         """Test Redis operations when connection is lost mid-operation."""
@@ -106,6 +132,51 @@ class TestEdgeCases:
         result = await service.set("test_key", {"data": "test"}, 300)
         assert result is False
 
+    @pytest.mark.asyncio
+    async def test_redis_batched_query_reads(self):
+        """Test batched query reads decode hits and keep misses as None."""
+        service = RedisService()
+        service.client = Mock()
+        service.client.mget = AsyncMock(return_value=['{"total_hits": 3}', None, "plain"])
+
+        result = await service.get_cached_queries(["a", "b", "c"])
+
+        assert result == [{"total_hits": 3}, None, "plain"]
+        service.client.mget.assert_awaited_once()
+
+        service.client.mget = AsyncMock(side_effect=ConnectionError("Connection lost"))
+        assert await service.get_cached_queries(["a", "b"]) == [None, None]
+
+    @pytest.mark.asyncio
+    async def test_redis_hot_query_served_locally(self):
+        """Test a repeated cached query lookup skips the Redis round-trip."""
+        service = RedisService()
+        service.client = Mock()
+        service.client.get = AsyncMock(return_value='{"query": {"match_all": {}}}')
+
+        first = await service.get_cached_query("hash")
+        second = await service.get_cached_query("hash")
+
+        assert first == second == {"query": {"match_all": {}}}
+        service.client.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_redis_coalesces_concurrent_query_misses(self):
+        """Test concurrent lookups of one query hash share a Redis GET."""
+        service = RedisService()
+        service.client = Mock()
+
+        async def mock_get(key):
+            await asyncio.sleep(0.01)
+            return None
+
+        service.client.get = AsyncMock(side_effect=mock_get)
+
+        results = await asyncio.gather(*[service.get_cached_query("hash") for _ in range(5)])
+
+        assert results == [None] * 5
+        assert service.client.get.await_count == 1
+
     @pytest.mark.asyncio
     async def test_gemini_with_rate_limiting(self):
         """Test Gemini service when rate limited."""
@@ -121,6 +192,128 @@ class TestEdgeCases:
         result = await service.generate_content("test prompt")
         assert result is None
 
+    @pytest.mark.asyncio
+    async def test_gemini_circuit_breaker_short_circuits_outage(self, monkeypatch):
+        """Test repeated outage failures stop further Gemini calls."""
+        monkeypatch.setattr(gemini_module, "BACKOFF_SCHEDULE", (0.0,))
+        service = GeminiService()
+        service.client = Mock()
+        service.client.aio.models.generate_content = AsyncMock(
+            side_effect=httpx.ConnectError("Service unavailable")
+        )
+        
+        for _ in range(2):
+            assert await service.generate_content("test prompt", temperature=0.9) is None
+        
+        calls = service.client.aio.models.generate_content.await_count
+        assert calls == gemini_module.CIRCUIT_FAILURE_THRESHOLD
+        
+        assert await service.generate_content("another prompt", temperature=0.9) is None
+        assert service.client.aio.models.generate_content.await_count == calls
+
+    @pytest.mark.asyncio
+    async def test_gemini_coalesces_identical_concurrent_requests(self):
+        """Test identical in-flight prompts share one API call."""
+        service = GeminiService()
+        service.client = Mock()
+        
+        async def mock_generate(**kwargs):
+            await asyncio.sleep(0.01)
+            return Mock(text="shared answer")
+        
+        service.client.aio.models.generate_content = AsyncMock(side_effect=mock_generate)
+        
+        results = await asyncio.gather(
+            *(service.generate_content("same prompt", temperature=0.9) for _ in range(3))
+        )
+        
+        assert results == ["shared answer"] * 3
+        assert service.client.aio.models.generate_content.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_gemini_intent_not_shared_across_time_ranges(self):
+        """Test messages differing only in time range get their own intent."""
+        service = GeminiService()
+        service.client = Mock()
+        service.client.aio.models.generate_content = AsyncMock(side_effect=[
+            Mock(text='{"intent": "search", "time_range": "last_week"}'),
+            Mock(text='{"intent": "search", "time_range": "last_30_days"}')
+        ])
+        
+        week = await service.analyze_query_intent("show errors from last week")
+        month = await service.analyze_query_intent("show errors from last month")
+        
+        assert week["time_range"] == "last_week"
+        assert month["time_range"] == "last_30_days"
+        assert service.client.aio.models.generate_content.await_count == 2
+        
+        # A repeated message is still served from the exact-match cache
+        assert await service.analyze_query_intent("show errors from last week") == week
+        assert service.client.aio.models.generate_content.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_gemini_batched_query_scoped_to_available_indices(self):
+        """Test a batched intent/query result is not reused for other indices."""
+        service = GeminiService()
+        service.client = Mock()
+        service.client.aio.models.generate_content = AsyncMock(side_effect=[
+            Mock(text='{"intent_analysis": {"intent": "search", "index": "sales"}, "es_query": {"size": 1}}'),
+            Mock(text='{"intent_analysis": {"intent": "search", "index": "orders"}, "es_query": {"size": 2}}')
+        ])
+
+        first = await service.analyze_and_generate("show recent sales", ["sales"])
+        second = await service.analyze_and_generate("show recent sales", ["orders"])
+
+        assert first[0]["index"] == "sales"
+        assert first[1] == {"size": 1}
+        assert second[0]["index"] == "orders"
+        assert second[1] == {"size": 2}
+        assert service.client.aio.models.generate_content.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_gemini_batched_general_intent_skips_query(self):
+        """Test the batched call is schema-constrained and general intent gets no query."""
+        service = GeminiService()
+        service.client = Mock()
+        service.client.aio.models.generate_content = AsyncMock(side_effect=[
+            Mock(text='{"intent_analysis": {"intent": "general"}, "es_query": {"query": {"match_all": {}}}}')
+        ])
+
+        intent_analysis, es_query = await service.analyze_and_generate("hi there", ["sales"])
+
+        assert intent_analysis["intent"] == "general"
+        assert es_query is None
+        config = service.client.aio.models.generate_content.await_args.kwargs["config"]
+        assert config.response_schema is gemini_module.IntentQuerySchema
+        assert config.max_output_tokens == gemini_module.BATCH_MAX_OUTPUT_TOKENS
+
+    @pytest.mark.asyncio
+    async def test_gemini_chart_recommendations_only_call_for_explanations(self, monkeypatch):
+        """Test chart recommendations make no Gemini calls besides explanations."""
+        monkeypatch.setattr(gemini_module.settings, "chart_explanation_ai_threshold", 1.1)
+        service = GeminiService()
+        service.client = Mock()
+        service.client.aio.models.generate_content = AsyncMock(return_value=Mock(text="explanation"))
+        data = [{"@timestamp": f"2024-01-{day:02d}T00:00:00", "total_amount": day} for day in range(1, 11)]
+
+        recommendations = await service.generate_enhanced_chart_recommendations(data, {"intent": "chart"})
+
+        assert recommendations
+        assert all(rec["ai_explanation"] == "explanation" for rec in recommendations)
+        assert service.client.aio.models.generate_content.await_count == len(recommendations)
+
+    def test_gemini_intent_validation_normalizes_case(self):
+        """Test mixed-case intent and chart type values are lowercased."""
+        service = GeminiService()
+
+        result = service._validate_intent_analysis({"intent": "Chart", "chart_type": "Bar"})
+        assert result["intent"] == "chart"
+        assert result["chart_type"] == "bar"
+
+        result = service._validate_intent_analysis({"intent": ["chart"], "chart_type": ["bar"]})
+        assert result["intent"] == "general"
+        assert result["chart_type"] is None
+
     def test_chart_data_edge_cases(self):
         """Test chart generation with edge case data."""
         # Test with empty data
@@ -0,0 +1,125 @@
+"""Test the query intelligence service."""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+import app.services.query_intelligence as query_intelligence_module
+from app.services.query_intelligence import QueryInsight, QueryIntelligenceService, QueryPattern
+
+
+def make_insight(pattern=QueryPattern.TIME_SERIES_ANALYSIS):
+    return QueryInsight(
+        pattern=pattern,
+        confidence=0.8,
+        reasoning="",
+        suggested_improvements=[],
+        related_patterns=[],
+        user_behavior_hint=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_session_context_lookups_are_coalesced():
+    """Test lookups within one batching window share a vector DB call."""
+    vector_db = Mock()
+    vector_db.get_session_contexts = AsyncMock(return_value={
+        "s1": [{"intent": "search"}],
+        "s2": []
+    })
+    service = QueryIntelligenceService(vector_db_service=vector_db)
+
+    results = await asyncio.gather(
+        service._get_session_context("s1"),
+        service._get_session_context("s2"),
+        service._get_session_context("s1")
+    )
+
+    assert results == [[{"intent": "search"}], [], [{"intent": "search"}]]
+    vector_db.get_session_contexts.assert_awaited_once_with(
+        ["s1", "s2"], limit=query_intelligence_module.BEHAVIOR_CONTEXT_LIMIT
+    )
+
+    # A lookup after the window starts a new batch
+    await service._get_session_context("s2")
+    assert vector_db.get_session_contexts.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_session_context_errors_reach_every_waiter():
+    """Test a failed batch raises in every coalesced lookup."""
+    vector_db = Mock()
+    vector_db.get_session_contexts = AsyncMock(side_effect=RuntimeError("vector DB down"))
+    service = QueryIntelligenceService(vector_db_service=vector_db)
+
+    results = await asyncio.gather(
+        service._get_session_context("s1"),
+        service._get_session_context("s2"),
+        return_exceptions=True
+    )
+
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert await service._analyze_user_behavior("s1", QueryPattern.DRILL_DOWN, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_session_context_falls_back_to_per_session_lookups():
+    """Test vector DBs without a batch method are queried per session."""
+    vector_db = Mock(spec=["get_conversation_context"])
+    vector_db.get_conversation_context = AsyncMock(side_effect=lambda session_id, *a, **k: [session_id])
+    service = QueryIntelligenceService(vector_db_service=vector_db)
+
+    results = await asyncio.gather(
+        service._get_session_context("s1"),
+        service._get_session_context("s2")
+    )
+
+    assert results == [["s1"], ["s2"]]
+    assert vector_db.get_conversation_context.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_profiles_evicted_beyond_capacity(monkeypatch):
+    """Test the least recently updated profile is dropped when full."""
+    monkeypatch.setattr(query_intelligence_module, "MAX_USER_PROFILES", 2)
+    service = QueryIntelligenceService()
+
+    for session_id in ("a", "b", "a", "c"):
+        await service.update_user_profile(session_id, make_insight(), {})
+
+    assert list(service.user_profiles) == ["a", "c"]
+    assert service._complexity_n == 2
+    assert service._complexity_sum == pytest.approx(
+        sum(profile.query_complexity for profile in service.user_profiles.values())
+    )
+
+
+@pytest.mark.asyncio
+async def test_idle_profiles_expire():
+    """Test profiles idle longer than the TTL are dropped."""
+    service = QueryIntelligenceService()
+    profile = await service.update_user_profile("a", make_insight(), {"chart_type": "bar"})
+    profile.last_updated_ts -= query_intelligence_module.USER_PROFILE_TTL + 1
+
+    suggestions = await service.get_personalized_suggestions("a")
+
+    assert "a" not in service.user_profiles
+    assert service._complexity_n == 0
+    assert suggestions == service._get_default_suggestions()
+
+
+@pytest.mark.parametrize("message", [
+    "show me the sales trend over time",
+    "compare revenue by region versus last year",
+    "what is the average response time per hour",
+    "find outliers and anomalies in the error rate distribution",
+    "nothing relevant here",
+    ""
+])
+def test_keyword_scanner_matches_substring_search(message):
+    """Test the single-pass scanner finds exactly the keywords contained in the message."""
+    service = QueryIntelligenceService()
+    keywords = {kw for rules in service.pattern_rules.values() for kw in rules.get("keywords", [])}
+
+    assert service._match_keywords(message) == {kw for kw in keywords if kw in message}
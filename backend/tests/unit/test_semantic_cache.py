@@ -0,0 +1,71 @@
+"""Test the semantic response cache."""
+
+import pytest
+from app.services.semantic_cache import SemanticCache
+
+
+EMBEDDINGS = {
+    "total sales by region": [1.0, 0.0, 0.0],
+    "sales totals per region": [0.95, 0.1, 0.0],
+    "error logs last week": [0.0, 1.0, 0.0],
+}
+
+
+def make_cache(**kwargs):
+    return SemanticCache(EMBEDDINGS.get, dim=3, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_paraphrase_hits_cache():
+    """Test a similar prompt returns the cached response."""
+    cache = make_cache()
+    await cache.put("intent", "total sales by region", "cached")
+    
+    assert await cache.get("intent", "sales totals per region") == "cached"
+    assert await cache.get("intent", "error logs last week") is None
+
+
+@pytest.mark.asyncio
+async def test_namespaces_are_isolated():
+    """Test entries are only matched within their namespace."""
+    cache = make_cache()
+    await cache.put("intent", "total sales by region", "cached")
+    
+    assert await cache.get("other", "total sales by region") is None
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_ignored():
+    """Test entries past their TTL are not returned."""
+    cache = make_cache(ttl=-1)
+    await cache.put("intent", "total sales by region", "cached")
+    
+    assert await cache.get("intent", "total sales by region") is None
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_when_full():
+    """Test the least recently used entry is evicted when the cache is full."""
+    cache = make_cache(max_entries=1)
+    await cache.put("intent", "total sales by region", "sales")
+    await cache.put("intent", "error logs last week", "logs")
+    
+    assert await cache.get("intent", "total sales by region") is None
+    assert await cache.get("intent", "error logs last week") == "logs"
+
+
+@pytest.mark.asyncio
+async def test_async_embedding_function_is_awaited():
+    """Test a coroutine embedding function is awaited directly."""
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return EMBEDDINGS.get(text)
+
+    cache = SemanticCache(embed, dim=3)
+    await cache.put("intent", "total sales by region", "cached")
+
+    assert await cache.get("intent", "sales totals per region") == "cached"
+    assert await cache.get("intent", "unknown text") is None
+    assert calls == ["total sales by region", "sales totals per region", "unknown text"]
@@ -0,0 +1,74 @@
+"""Test JSON serialization helpers."""
+
+from decimal import Decimal
+
+import numpy as np
+
+from app.utils.serialization import dumpb, dumps, extract_json_object, loads
+
+
+def test_extract_plain_object():
+    """Test extraction of a bare JSON object."""
+    assert extract_json_object('{"intent": "chart"}') == {"intent": "chart"}
+
+
+def test_extract_fenced_object():
+    """Test extraction from a Markdown code fence."""
+    response = '```json\n{"intent": "search", "fields": ["a"]}\n```'
+    assert extract_json_object(response) == {"intent": "search", "fields": ["a"]}
+
+
+def test_extract_object_surrounded_by_prose():
+    """Test extraction ignores surrounding text and trailing braces."""
+    response = 'Here you go: {"query": {"match_all": {}}} Hope that helps {sic}'
+    assert extract_json_object(response) == {"query": {"match_all": {}}}
+
+
+def test_extract_object_with_braces_in_strings():
+    """Test braces and escaped quotes inside strings are not counted."""
+    response = '{"description": "use {braces} and \\"quotes\\"", "n": 1}'
+    assert extract_json_object(response) == {
+        "description": 'use {braces} and "quotes"',
+        "n": 1,
+    }
+
+
+def test_extract_skips_invalid_candidates():
+    """Test an unparseable leading object does not hide a later valid one."""
+    assert extract_json_object('{not json} then {"ok": true}') == {"ok": True}
+
+
+def test_extract_returns_none_without_object():
+    """Test None is returned when no object is present."""
+    assert extract_json_object("no json here") is None
+    assert extract_json_object('{"unterminated": 1') is None
+
+
+def test_dumps_round_trip():
+    """Test dumps output can be parsed back, with and without indentation."""
+    data = {"intent": "chart", "fields": ["a", "b"], "confidence": 0.5}
+    
+    assert loads(dumps(data)) == data
+    assert loads(dumps(data, indent=True)) == data
+    assert "\n  " in dumps(data, indent=True)
+
+
+def test_dumps_handles_non_json_values():
+    """Test numpy and other non-JSON values are serialized instead of raising."""
+    data = {"count": np.int64(3), "mean": np.float64(1.5), "price": Decimal("9.99")}
+    
+    result = loads(dumps(data))
+    
+    assert result["count"] == 3
+    assert result["mean"] == 1.5
+    assert result["price"] == "9.99"
+
+
+def test_dumpb_returns_parseable_bytes():
+    """Test dumpb emits UTF-8 bytes that loads parses back."""
+    data = {"session": "abc", "count": np.int64(2), "name": "caf\u00e9"}
+    
+    result = dumpb(data)
+    
+    assert isinstance(result, bytes)
+    assert loads(result) == {"session": "abc", "count": 2, "name": "caf\u00e9"}
@@ -0,0 +1,135 @@
+"""Test the vector DB service."""
+
+import threading
+
+import chromadb
+import numpy as np
+import pytest
+
+import app.services.vector_db as vector_db_module
+from app.services.vector_db import VectorDBService
+
+
+DIM = 384
+
+
+def unit(*components):
+    """Unit vector with the given leading components."""
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingModel:
+    """Embedding model returning fixed vectors for known texts."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.threads = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.threads.append(threading.current_thread().name)
+        return np.stack([self.vectors[text] for text in texts])
+
+
+@pytest.fixture
+def make_service(tmp_path, monkeypatch):
+    """Build a VectorDBService on a temporary Chroma directory."""
+    persistent_client = chromadb.PersistentClient
+
+    def make(vectors):
+        monkeypatch.setattr(
+            vector_db_module.chromadb,
+            "PersistentClient",
+            lambda path: persistent_client(path=str(tmp_path))
+        )
+        monkeypatch.setattr(vector_db_module, "_load_embedding_model", lambda: FakeEmbeddingModel(vectors))
+        return VectorDBService()
+    return make
+
+
+@pytest.mark.asyncio
+async def test_search_orders_by_similarity(make_service):
+    """Test results are ordered by cosine similarity and cut to the limit."""
+    service = make_service({})
+    collection = service.query_collection
+    embeddings = np.stack([unit(0.6, 0.8), unit(0.9, 0.1), unit(0.8, 0.6), unit(-1, 0)])
+    collection.upsert(ids=["b", "a", "c", "d"], embeddings=embeddings, metadatas=[{"n": i} for i in range(4)])
+
+    results = await service._search_collection(collection, unit(1, 0), 2)
+
+    assert [item_id for item_id, _, _ in results] == ["a", "c"]
+    assert results[0][1] == {"n": 1}
+    assert results[0][2] == pytest.approx(float(unit(0.9, 0.1)[0]), abs=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_search_sees_writes_from_other_processes(make_service):
+    """Test documents added or overwritten by another process are searched."""
+    service = make_service({})
+    collection = service.query_collection
+    collection.upsert(ids=["a"], embeddings=np.stack([unit(0, 1)]), metadatas=[{"n": 0}])
+    assert [r[0] for r in await service._search_collection(collection, unit(1, 0), 1)] == ["a"]
+
+    # Written directly to Chroma, as another worker would
+    collection.upsert(ids=["b"], embeddings=np.stack([unit(1, 0)]), metadatas=[{"n": 1}])
+
+    assert [r[0] for r in await service._search_collection(collection, unit(1, 0), 1)] == ["b"]
+
+    # Overwritten in place, as another worker would
+    collection.upsert(ids=["a"], embeddings=np.stack([unit(1, 0.01)]), metadatas=[{"n": 2}])
+    collection.upsert(ids=["b"], embeddings=np.stack([unit(0, 1)]), metadatas=[{"n": 1}])
+
+    assert [r[0] for r in await service._search_collection(collection, unit(1, 0), 1)] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_flushed_writes_are_searchable(make_service):
+    """Test documents stored through the service are found once flushed."""
+    service = make_service({"sales by region": unit(1, 0), "error logs": unit(0, 1)})
+    await service.store_query_example("error logs", {"query": {}}, "search", "logs")
+    await service.flush()
+    await service._search_collection(service.query_collection, unit(0, 1), 1)
+
+    await service.store_query_example("sales by region", {"query": {}}, "aggregate", "sales")
+    await service.flush()
+
+    results = await service.find_similar_queries("sales by region", limit=1)
+
+    assert [r["natural_query"] for r in results] == ["sales by region"]
+
+
+@pytest.mark.asyncio
+async def test_search_cache_embeds_through_the_batched_encoder(make_service):
+    """Test search cache lookups encode on the encoder thread, once per text."""
+    service = make_service({"sales by region": unit(1, 0)})
+
+    await service.find_similar_queries("sales by region")
+    await service.get_relevant_schemas("sales by region")
+
+    assert len(service.embedding_model.threads) == 1
+    assert service.embedding_model.threads[0].startswith("embedding")
+
+
+@pytest.mark.asyncio
+async def test_session_contexts_keep_newest_entries(make_service):
+    """Test each session gets its most recent entries, newest first."""
+    service = make_service({})
+    metadatas = [
+        {"session_id": "s1", "user_message": "legacy", "intent": "search"},
+        {"session_id": "s1", "user_message": "third", "intent": "chart", "timestamp": 30.0},
+        {"session_id": "s1", "user_message": "first", "intent": "search", "timestamp": 10.0},
+        {"session_id": "s2", "user_message": "other", "intent": "count", "timestamp": 5.0},
+        {"session_id": "s1", "user_message": "second", "intent": "count", "timestamp": 20.0},
+    ]
+    service.context_collection.upsert(
+        ids=[f"c{i}" for i in range(len(metadatas))],
+        embeddings=np.stack([unit(1, i) for i in range(len(metadatas))]),
+        metadatas=metadatas
+    )
+
+    contexts = await service.get_session_contexts(["s1", "s2", "s3"], limit=2)
+
+    assert [c["user_message"] for c in contexts["s1"]] == ["third", "second"]
+    assert [c["user_message"] for c in contexts["s2"]] == ["other"]
+    assert contexts["s3"] == []